@@ -1,5 +1,5 @@
 ## package initialization
 from .utils import environment_check
 
-# run environment checks at package import time
-environment_check()
+# run environment checks at package import time (cheap: yaml is imported lazily where it is used)
+environment_check(required_modules=())
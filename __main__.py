@@ -1,39 +1,61 @@
 ## package entrypoint (environment check handled by package import)
 
+## forward to a warm server if SUBCOMMAND_SERVER is set (runs locally if none answers)
+import os
+import sys
+if __name__ == '__main__' and os.environ.get('SUBCOMMAND_SERVER'):
+    import client
+    status = client.forward(os.environ['SUBCOMMAND_SERVER'])
+    if status is not None:
+        sys.exit(status)
+
+## start profiler first if requested (--profile-startup)
+import profiler
+profiler.enable_from_argv(sys.argv[1:])
+
 ## load standard libraries
+from collections.abc import Mapping
 from dataclasses import dataclass, field
 from pathlib import Path
 
 ## load subcommands_framework libraries
-from config import GlobalConfig
-from configfile import load_package_config, initialize_params
+with profiler.phase('import_framework'):
+    from config import GlobalConfig, LayeredConfig
+    from configfile import load_package_config, initialize_params
 
 ## run main routine
 if __name__ == '__main__':
     ## determine package location and load package config file
     package_dir = Path(__file__).resolve().parent
-    package_config = load_package_config(package_dir)
+    with profiler.phase('load_package_config'):
+        package_config = load_package_config(package_dir)
 
     ## define script config
     @dataclass(kw_only=True)
     class ConfigPackage:
-        prog: str = str(package_dir.name)           # program name
+        prog: str = str(package_dir.stem if package_dir.suffix == '.pyz' else package_dir.name) # program name
         description: str = ''                       # program description
         version: float = 0.0                        # version
-        package_dir: Path = package_dir             # package installation directory
+        package_dir: Path = package_dir             # package installation directory (or .pyz bundle)
         subcommands_dir: Path = Path('subcommand') # subcommands directory relatively to package_dir
         data_dir: Path = Path('data')               # data directory relatively to package_dir
         debug: bool = False                         # debug mode flag
-        params: dict = field(default_factory=dict)  # package config and user defined config
+        lazy_subcommands: bool = True               # import selected subcommand only via manifest
+        parser_cache: bool = False                  # rebuild argument parser from on-disk spec cache
+        slots_config: bool = False                  # compose slotted config classes
+        params: Mapping = field(default_factory=dict) # package and user config (read-only LayeredConfig)
 
     ## initialize GlobalConfig with ConfigPackage and update package field of package_config
     package_params = None
     if 'package' in package_config:
         package_params = package_config['package']
-        params = initialize_params(ConfigPackage, package_params)
-        GlobalConfig.set_config(ConfigPackage(**params))
-        GlobalConfig.set('params', package_config)
+        with profiler.phase('initialize_config'):
+            params = initialize_params(ConfigPackage, package_params)
+            GlobalConfig.set_slots(params['slots_config'])
+            GlobalConfig.set_config(ConfigPackage(**params))
+            GlobalConfig.set('params', LayeredConfig.of(package_config, 'package'))
 
     ## call main function
-    from main import main
+    with profiler.phase('import_main'):
+        from main import main
     main()
@@ -1,5 +1,9 @@
 import argparse
-from typing import Tuple
+import importlib
+import inspect
+import types
+from functools import partial
+from typing import NamedTuple, Tuple
 
 class ListArgumentAction(argparse.Action):
     """new action to take CSV as list"""
@@ -93,6 +97,109 @@ def config_arguments(default_configfiles: list) -> argparse.ArgumentParser:
     )
     return parser_config
 
+def profile_arguments() -> argparse.ArgumentParser:
+    """parse arguments for startup profiling (scanned from argv by profiler before parsing)"""
+    parser_profile = argparse.ArgumentParser(add_help=False)
+    args_profile = parser_profile.add_argument_group('profiling options')
+    args_profile.add_argument(
+        '--profile-startup',
+        action='store_true',
+        help='write JSON timing report of startup and execution phases'
+    )
+    args_profile.add_argument(
+        '--profile-output',
+        help='timing report file (default: stderr)',
+        metavar='FILE'
+    )
+    args_profile.add_argument(
+        '--profile-pstats',
+        help='dump cProfile statistics to FILE (enables profiling)',
+        metavar='FILE'
+    )
+    return parser_profile
+
+def positive_int(value: str) -> int:
+    """argparse type of integers >= 1"""
+    n = int(value)
+    if n < 1:
+        raise argparse.ArgumentTypeError(f'must be at least 1: {value!r}')
+    return n
+
+def mode_arguments() -> argparse.ArgumentParser:
+    """parse arguments selecting how the invocation runs (root options, read by main before parsing)"""
+    parser_mode = argparse.ArgumentParser(add_help=False)
+    args_mode = parser_mode.add_argument_group('run mode options')
+    args_mode.add_argument(
+        '--serve',
+        help='build the parser once and serve invocations forwarded by clients\n(SUBCOMMAND_SERVER=SOCKET) on the Unix socket',
+        metavar='SOCKET'
+    )
+    args_mode.add_argument(
+        '--batch',
+        help='run command lines of FILE (- for stdin) with one parser',
+        metavar='FILE'
+    )
+    args_mode.add_argument(
+        '--batch-jobs',
+        type=positive_int,
+        default=1,
+        help='run batch lines in N forked worker processes (default: 1)',
+        metavar='N'
+    )
+    args_mode.add_argument(
+        '--batch-report',
+        help='write JSON line with exit status of each batch line to FILE (- for stderr)',
+        metavar='FILE'
+    )
+    return parser_mode
+
+def option_takes_value(arg: str, parsers: list) -> bool:
+    """return True if option arg of parsers consumes the next argument
+
+    long options are matched like argparse does, unique prefixes included
+    ("--conf FILE"); "--option=value" carries its value
+    """
+    if '=' in arg:
+        return False
+    actions = {option: action for parser in parsers for action in parser._actions for option in action.option_strings}
+    action = actions.get(arg)
+    if action is None and arg.startswith('--'):
+        matches = {id(a): a for option, a in actions.items() if option.startswith(arg)}
+        if len(matches) == 1:
+            action, = matches.values()
+    return action is not None and action.nargs != 0
+
+def add_placeholder_parser(subparsers: argparse._SubParsersAction, name: str, aliases: list, help: str | None, load) -> argparse.ArgumentParser:
+    """add subcommand parser only listed in the root help
+
+    parsing it sets load_subcommand=load, a callable registering the real parser
+    (dispatch calls it and parses again)
+    """
+    kwargs = {} if help is None else {'help': help}
+    parser = subparsers.add_parser(name, aliases=aliases, add_help=False, **kwargs)
+    parser.set_defaults(load_subcommand=load)
+    return parser
+
+def remove_subparsers(subparsers: argparse._SubParsersAction, names: list):
+    """remove subcommand parsers of names (and their help entries)"""
+    for name in names:
+        subparsers._name_parser_map.pop(name, None)
+    subparsers._choices_actions = [a for a in subparsers._choices_actions if a.dest not in names]
+
+def root_argv(argv: list, parent_parsers: list) -> list:
+    """return leading part of argv holding root options (up to the subcommand or '--')"""
+    out = []
+    args = iter(argv)
+    for arg in args:
+        if arg == '--' or not arg.startswith('-'):
+            break
+        out.append(arg)
+        if option_takes_value(arg, parent_parsers):
+            value = next(args, None)
+            if value is not None:
+                out.append(value)
+    return out
+
 def error_nosubcommand(parser: argparse.ArgumentParser):
     """print error if no subcommand is specified"""
     print(f'ERROR: missing subcommand')
@@ -114,3 +221,189 @@ def build_root_parser(prog: str, description: str, parent_parsers: list) -> Tupl
     )
     subparsers.dest = 'command'
     return parser, subparsers
+
+## parser specification (serializable description of a built parser)
+class SpecRef(NamedTuple):
+    """reference to a module level class or function"""
+    module: str
+    qualname: str
+
+class SpecError(ValueError):
+    """parser cannot be described by a specification"""
+
+PARSER_SPEC_ATTRS = (
+    'prog', 'usage', 'description', 'epilog', 'formatter_class', 'prefix_chars',
+    'fromfile_prefix_chars', 'argument_default', 'conflict_handler', 'allow_abbrev', 'exit_on_error'
+)
+
+def _encode_value(value):
+    """replace classes and functions by references"""
+    if isinstance(value, (type, types.FunctionType, types.BuiltinFunctionType)):
+        module = getattr(value, '__module__', None)
+        qualname = getattr(value, '__qualname__', '')
+        if module is None or '<' in qualname:
+            raise SpecError(f'cannot refer to {value!r}')
+        return SpecRef(module, qualname)
+    return value
+
+def _decode_value(value):
+    """resolve references"""
+    if isinstance(value, SpecRef):
+        obj = importlib.import_module(value.module)
+        for name in value.qualname.split('.'):
+            obj = getattr(obj, name)
+        return obj
+    return value
+
+def _init_params(cls) -> dict:
+    """return keyword parameters and defaults of action class constructor"""
+    params = {}
+    for name, p in inspect.signature(cls.__init__).parameters.items():
+        if name in ('self', 'option_strings') or p.kind in (p.VAR_POSITIONAL, p.VAR_KEYWORD):
+            continue
+        params[name] = p.default
+    return params
+
+def _dump_action(action) -> dict:
+    """describe single action"""
+    kwargs = {}
+    for name, default in _init_params(type(action)).items():
+        value = getattr(action, name, default)
+        if value is default or (value is None and default is not inspect.Parameter.empty):
+            continue
+        kwargs[name] = _encode_value(value)
+    if not action.option_strings:
+        kwargs.pop('required', None)
+    return {'class': _encode_value(type(action)), 'option_strings': list(action.option_strings), 'kwargs': kwargs}
+
+def dump_parser_spec(parser: argparse.ArgumentParser, subcommand_modules: dict | None = None) -> dict:
+    """describe parser, its groups, actions, defaults and subparsers
+
+    subcommand_modules maps subcommand name to the module registering it
+    """
+    subcommand_modules = subcommand_modules or {}
+    groups = parser._action_groups
+    group_of = {id(a): i for i, g in enumerate(groups) for a in g._group_actions}
+    mutexes = parser._mutually_exclusive_groups
+    mutex_of = {id(a): i for i, m in enumerate(mutexes) for a in m._group_actions}
+    actions = []
+    for action in parser._actions:
+        if isinstance(action, argparse._SubParsersAction):
+            helps = {a.dest: a.help for a in action._choices_actions}
+            names = {}
+            for name, p in action.choices.items():
+                names.setdefault(id(p), (p, []))[1].append(name)
+            spec = {
+                'class': _encode_value(type(action)),
+                'subparsers': {
+                    'prog': action._prog_prefix,
+                    'parser_class': _encode_value(action._parser_class),
+                    'dest': action.dest,
+                    'required': action.required,
+                    'help': action.help,
+                    'metavar': action.metavar
+                },
+                'children': [
+                    {
+                        'name': name,
+                        'aliases': aliases,
+                        'help': helps.get(name),
+                        'module': subcommand_modules.get(name),
+                        'parser': dump_parser_spec(p, subcommand_modules)
+                    }
+                    for p, (name, *aliases) in names.values()
+                ]
+            }
+        else:
+            spec = _dump_action(action)
+        spec['group'] = group_of.get(id(action))
+        spec['mutex'] = mutex_of.get(id(action))
+        actions.append(spec)
+    return {
+        'parser': {name: _encode_value(getattr(parser, name)) for name in PARSER_SPEC_ATTRS},
+        'groups': [{'title': g.title, 'description': g.description} for g in groups],
+        'mutexes': [
+            {'group': next((i for i, g in enumerate(groups) if g is m._container), None), 'required': m.required}
+            for m in mutexes
+        ],
+        'actions': actions,
+        'defaults': {k: _encode_value(v) for k, v in parser._defaults.items()}
+    }
+
+def _load_subparser(subparsers: argparse._SubParsersAction, spec: dict, command: str, load=None):
+    """build parser of command in place of its placeholder, load(command) runs first"""
+    if load is not None:
+        load(command)
+    build_subparser_from_spec(subparsers, spec, command)
+
+def _populate_parser(parser: argparse.ArgumentParser, spec: dict, load=None):
+    """add groups, actions and defaults of spec to parser created without help
+
+    subcommands are placeholders building their parser when selected (see
+    add_placeholder_parser), load(command) is called before
+    """
+    groups = [parser._positionals, parser._optionals]
+    for i, g in enumerate(spec['groups']):
+        if i < len(groups):
+            groups[i].title = g['title']
+            groups[i].description = g['description']
+        else:
+            groups.append(parser.add_argument_group(g['title'], g['description']))
+    mutexes = [
+        (parser if m['group'] is None else groups[m['group']]).add_mutually_exclusive_group(required=m['required'])
+        for m in spec['mutexes']
+    ]
+    subparsers = None
+    for a in spec['actions']:
+        container = groups[a['group']] if a['group'] is not None else parser
+        if a['mutex'] is not None:
+            container = mutexes[a['mutex']]
+        if 'subparsers' in a:
+            kwargs = {k: _decode_value(v) for k, v in a['subparsers'].items()}
+            subparsers = _decode_value(a['class'])(option_strings=[], **kwargs)
+            parser._subparsers = container
+            container._add_action(subparsers)
+            for child in a['children']:
+                add_placeholder_parser(
+                    subparsers, child['name'], child['aliases'], child['help'],
+                    partial(_load_subparser, subparsers, spec, child['name'], load)
+                )
+            continue
+        kwargs = {k: _decode_value(v) for k, v in a['kwargs'].items()}
+        names = a['option_strings'] or [kwargs.pop('dest')]
+        container.add_argument(*names, action=_decode_value(a['class']), **kwargs)
+    parser.set_defaults(**{k: _decode_value(v) for k, v in spec['defaults'].items()})
+    return subparsers
+
+def build_parser_from_spec(spec: dict, load=None) -> Tuple[argparse.ArgumentParser, argparse._SubParsersAction | None]:
+    """rebuild parser from spec, subcommand parsers are placeholders for the help listing
+
+    load(command) is called before a selected placeholder builds its parser
+    """
+    kwargs = {k: _decode_value(v) for k, v in spec['parser'].items()}
+    parser = argparse.ArgumentParser(add_help=False, **kwargs)
+    subparsers = _populate_parser(parser, spec, load)
+    return parser, subparsers
+
+def build_subparser_from_spec(subparsers: argparse._SubParsersAction, spec: dict, command: str) -> argparse.ArgumentParser | None:
+    """replace placeholder of command (name or alias) by its completely built parser"""
+    for child in parser_spec_children(spec):
+        if command in [child['name'], *child['aliases']]:
+            kwargs = {k: _decode_value(v) for k, v in child['parser']['parser'].items()}
+            parser = subparsers._parser_class(add_help=False, **kwargs)
+            _populate_parser(parser, child['parser'])
+            for name in [child['name'], *child['aliases']]:
+                subparsers._name_parser_map[name] = parser
+            return parser
+    return None
+
+def parser_spec_children(spec: dict) -> list:
+    """return subcommand specs of spec"""
+    for a in spec['actions']:
+        if 'subparsers' in a:
+            return a['children']
+    return []
+
+def parser_spec_subcommands(spec: dict) -> list:
+    """return subcommand entries (name, aliases, help, module) of spec"""
+    return [{k: c[k] for k in ('name', 'aliases', 'help', 'module')} for c in parser_spec_children(spec)]
@@ -0,0 +1,76 @@
+## GlobalConfig benchmarks
+"""extend_schema composition, config.<field> access compared with plain attribute access
+and subcommand defaults merging (dict copies vs LayeredConfig)"""
+import json
+import sys
+import time
+import timeit
+from dataclasses import dataclass, field, make_dataclass
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from config import GlobalConfig, LayeredConfig, config
+
+def make_config(nfields: int = 200):
+    """initialize GlobalConfig with many fields and a large params dict"""
+    spec = [(f'field{i}', int, field(default=i)) for i in range(nfields)]
+    spec.append(('params', dict, field(default_factory=lambda: {f'k{i}': list(range(10)) for i in range(10000)})))
+    Config = make_dataclass('Config', spec, kw_only=True)
+    GlobalConfig.set_config(Config())
+    return GlobalConfig.get_config()
+
+def bench_extend_schema(nmodules: int, nfields: int = 10) -> float:
+    """return time to append nmodules schemas of nfields fields and access the result"""
+    fragments = [
+        make_dataclass(f'Fragment{m}', [(f'm{m}_f{i}', int, field(default=i)) for i in range(nfields)])
+        for m in range(nmodules)
+    ]
+    make_config(nfields=10)
+    t0 = time.perf_counter()
+    for fragment in fragments:
+        config.append_config(fragment)
+    getattr(config, f'm{nmodules - 1}_f0')
+    elapsed = time.perf_counter() - t0
+    GlobalConfig.reset()
+    return elapsed
+
+def bench_access(loops: int = 100000, repeat: int = 5) -> dict:
+    """return best time per access of plain attribute, proxy and GlobalConfig.get"""
+    instance = make_config()
+    results = {
+        'plain': min(timeit.repeat(lambda: instance.field150, number=loops, repeat=repeat)),
+        'proxy': min(timeit.repeat(lambda: config.field150, number=loops, repeat=repeat)),
+        'get': min(timeit.repeat(lambda: GlobalConfig.get('field150'), number=loops, repeat=repeat)),
+        'items': min(timeit.repeat(GlobalConfig.items, number=loops // 100, repeat=repeat)) * 100,
+    }
+    GlobalConfig.reset()
+    out = {f'config_{k}_ns': v / loops * 1e9 for k, v in results.items()}
+    out['config_proxy_ratio'] = results['proxy'] / results['plain']
+    return out
+
+def bench_command_defaults(nmodules: int = 20) -> dict:
+    """return time to build defaults of nmodules subcommands by copying and by layering"""
+    instance = make_config()
+    instance.params = LayeredConfig.of({**instance.params, 'command': {f'cmd{m}': {'field1': m} for m in range(nmodules)}})
+    t0 = time.perf_counter()
+    for m in range(nmodules):
+        defaults = {**config.to_dict(), **config.params.get('command', {}).get(f'cmd{m}', {})}
+        defaults['field1'], defaults['field150']
+    t1 = time.perf_counter()
+    for m in range(nmodules):
+        defaults = config.command_defaults(f'cmd{m}')
+        defaults['field1'], defaults['field150']
+    t2 = time.perf_counter()
+    GlobalConfig.reset()
+    return {f'config_defaults_copy_{nmodules}_s': t1 - t0, f'config_defaults_layered_{nmodules}_s': t2 - t1}
+
+def run(quick: bool = False) -> dict:
+    """run all GlobalConfig benchmarks"""
+    out = bench_access(loops=20000 if quick else 100000)
+    for n in (10, 100) if quick else (10, 100, 1000):
+        out[f'config_extend_schema_{n}_s'] = bench_extend_schema(n)
+    out.update(bench_command_defaults(5 if quick else 20))
+    return out
+
+if __name__ == '__main__':
+    print(json.dumps(run('--quick' in sys.argv), indent=2))
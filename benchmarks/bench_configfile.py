@@ -0,0 +1,41 @@
+## configfile benchmarks
+"""initialize_params and initialize_params_many conversion throughput"""
+import json
+import sys
+import time
+from dataclasses import field, make_dataclass
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from configfile import initialize_params, initialize_params_many
+
+def make_schema(nfields: int = 40):
+    """return dataclass with int, float, str, list, bool and Path fields"""
+    kinds = [(int, 0), (float, 0.0), (str, ''), (bool, False), (Path, Path('/'))]
+    spec = []
+    for i in range(nfields):
+        ftype, default = kinds[i % len(kinds)]
+        spec.append((f'f{i}', ftype, field(default=default)))
+    spec.append(('items', list, field(default_factory=list)))
+    return make_dataclass('Params', spec)
+
+def run(quick: bool = False) -> dict:
+    """return converted parameter records per second"""
+    schema = make_schema()
+    record = {f'f{i}': 'true' if i % 5 == 3 else str(i) for i in range(40)}
+    record['items'] = ('a', 'b')
+    nrecords = 2000 if quick else 20000
+    t0 = time.perf_counter()
+    for _ in range(nrecords):
+        initialize_params(schema, record)
+    elapsed = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    initialize_params_many(schema, [record] * nrecords)
+    elapsed_many = time.perf_counter() - t0
+    return {
+        'initialize_params_records_per_s': nrecords / elapsed,
+        'initialize_params_many_records_per_s': nrecords / elapsed_many
+    }
+
+if __name__ == '__main__':
+    print(json.dumps(run('--quick' in sys.argv), indent=2))
@@ -0,0 +1,111 @@
+## ResultLogger benchmarks
+"""ResultLogger.result throughput and caller latency of queue logging mode"""
+import io
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from logger import get_logger, setup_logging, stop_queue_logging, set_result_buffering, close_result_handlers
+
+def bench_stdout(nlines: int) -> float:
+    """return lines per second written to stdout (captured in memory)"""
+    logger = get_logger('bench_stdout')
+    handler = logger.handlers[0]
+    stream = io.StringIO()
+    handler.setStream(stream)
+    try:
+        t0 = time.perf_counter()
+        for i in range(nlines):
+            logger.result(['row', i, 'value'])
+        elapsed = time.perf_counter() - t0
+    finally:
+        handler.setStream(sys.stdout)
+    return nlines / elapsed
+
+def bench_logfile(nlines: int) -> float:
+    """return lines per second written to logfile"""
+    logger = get_logger('bench_logfile')
+    handler = logger.handlers[0]
+    handler.setStream(io.StringIO())
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            logfile = os.path.join(tmp, 'result.log')
+            t0 = time.perf_counter()
+            for i in range(nlines):
+                logger.result(['row', i, 'value'], logfile=logfile, output_stdout=False)
+            close_result_handlers()
+            elapsed = time.perf_counter() - t0
+    finally:
+        handler.setStream(sys.stdout)
+    return nlines / elapsed
+
+def bench_result_many(nlines: int, format: str = 'text') -> float:
+    """return lines per second written to stdout by result_many (captured in memory)"""
+    logger = get_logger('bench_result_many')
+    handler = logger.handlers[0]
+    handler.setStream(io.StringIO())
+    try:
+        t0 = time.perf_counter()
+        logger.result_many((['row', i, 'value'] for i in range(nlines)), format=format)
+        elapsed = time.perf_counter() - t0
+    finally:
+        handler.setStream(sys.stdout)
+    return nlines / elapsed
+
+class SlowHandler(logging.Handler):
+    """handler simulating a slow log target (e.g. NFS)"""
+    def __init__(self, delay=0.0002):
+        super().__init__()
+        self.delay = delay
+    def emit(self, record):
+        time.sleep(self.delay)
+
+def bench_queue_logging(nrecords: int, use_queue: bool) -> float:
+    """return mean caller latency per record with slow handlers"""
+    with tempfile.TemporaryDirectory() as tmp:
+        cfg_path = os.path.join(tmp, 'logging.yaml')
+        with open(cfg_path, 'w', encoding='utf-8') as f:
+            f.write(
+                'version: 1\n'
+                'handlers:\n'
+                '  slow1: {"()": bench_logger.SlowHandler}\n'
+                '  slow2: {"()": bench_logger.SlowHandler}\n'
+                'loggers:\n'
+                '  bench_queue: {level: INFO, handlers: [slow1, slow2], propagate: false}\n'
+            )
+        setup_logging(cfg_path, use_queue=use_queue, queue_size=nrecords)
+        logger = get_logger('bench_queue')
+        t0 = time.perf_counter()
+        for i in range(nrecords):
+            logger.info('record %d', i)
+        elapsed = time.perf_counter() - t0
+        stop_queue_logging()
+    return elapsed / nrecords
+
+def run(quick: bool = False) -> dict:
+    """run all ResultLogger benchmarks"""
+    nlines = 10000 if quick else 100000
+    out = {
+        'result_stdout_lines_per_s': bench_stdout(nlines),
+        'result_logfile_lines_per_s': bench_logfile(nlines),
+    }
+    for format in ('text', 'csv', 'jsonl', 'table'):
+        out[f'result_many_{format}_lines_per_s'] = bench_result_many(nlines, format)
+    set_result_buffering(buffer_size=1 << 16)
+    try:
+        out['result_logfile_buffered_lines_per_s'] = bench_logfile(nlines)
+    finally:
+        set_result_buffering()
+        close_result_handlers()
+    nrecords = 200 if quick else 2000
+    out['logging_slow_handlers_latency_s'] = bench_queue_logging(nrecords, use_queue=False)
+    out['logging_slow_handlers_queue_latency_s'] = bench_queue_logging(nrecords, use_queue=True)
+    return out
+
+if __name__ == '__main__':
+    print(json.dumps(run('--quick' in sys.argv), indent=2))
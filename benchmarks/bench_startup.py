@@ -0,0 +1,65 @@
+## cold start benchmark
+"""measure `python <package> ...` wall time for synthetic packages (directory, .pyz bundle
+and thin client of a warm server)"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from synthetic import make_package
+from bundle import build_bundle
+from install import package_files
+
+def time_command(argv: list, env: dict, repeat: int) -> float:
+    """return median wall time of command"""
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        subprocess.run(argv, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times)
+
+def run(quick: bool = False, sizes=(10, 100, 1000), repeat: int = 5) -> dict:
+    """return startup time of --help and one subcommand per package size and mode"""
+    if quick:
+        sizes, repeat = sizes[:2], 3
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        modes = {
+            'eager': {'lazy_subcommands': False},
+            'lazy': {'lazy_subcommands': True},
+            'parser_cache': {'parser_cache': True},
+            'bundle': {'lazy_subcommands': True},
+            'server': {'lazy_subcommands': True},
+        }
+        for n in sizes:
+            for mode, package in modes.items():
+                pkg = make_package(Path(tmp) / mode, n, package=package)
+                if mode == 'bundle':
+                    ## lazy package as single-file zipapp with unchecked-hash pycs
+                    pkg = build_bundle(pkg, pkg.with_name(pkg.name + '.pyz'), package_files(pkg))
+                env = dict(os.environ, SUBCOMMAND_CACHE_DIR=str(Path(tmp) / mode / 'cache'))
+                server = None
+                if mode == 'server':
+                    sock = Path(tmp) / mode / f'{n}.sock'
+                    server = subprocess.Popen([sys.executable, str(pkg), '--serve', str(sock)], env=env)
+                    while not sock.exists() and server.poll() is None:
+                        time.sleep(0.01)
+                    env['SUBCOMMAND_SERVER'] = str(sock)
+                ## first run builds manifest and caches
+                subprocess.run([sys.executable, str(pkg), '--help'], env=env, stdout=subprocess.DEVNULL, check=False)
+                results[f'startup_{mode}_{n}_help_s'] = time_command([sys.executable, str(pkg), '--help'], env, repeat)
+                results[f'startup_{mode}_{n}_cmd_s'] = time_command([sys.executable, str(pkg), 'cmd0', 'x'], env, repeat)
+                if server is not None:
+                    server.terminate()
+                    server.wait()
+    return results
+
+if __name__ == '__main__':
+    print(json.dumps(run('--quick' in sys.argv), indent=2))
@@ -0,0 +1,125 @@
+## tarball benchmarks
+"""tarball_create and tarball_restore on large trees, recursive_chmod and force_rmtree"""
+import base64
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from utils import tarball_create, tarball_create_many, tarball_restore, tarball_list, tarball_extract_member
+from utils import recursive_chmod, force_rmtree, TARBALL_INDEX_SUFFIX, _zstd_module
+
+def make_tree(root: Path, nfiles: int, size: int, ndirs: int = 20) -> Path:
+    """create tree of nfiles partly compressible (base64 random) files spread over ndirs directories"""
+    target = root / 'tree'
+    rng = random.Random(0)
+    for i in range(nfiles):
+        d = target / f'dir{i % ndirs}'
+        d.mkdir(parents=True, exist_ok=True)
+        (d / f'file{i}.txt').write_bytes(base64.b64encode(rng.randbytes(size * 3 // 4)))
+    return target
+
+def bench_tree(nfiles: int, size: int, **kwargs) -> dict:
+    """return create and restore time of one tree"""
+    with tempfile.TemporaryDirectory() as tmp:
+        target = make_tree(Path(tmp), nfiles, size)
+        outdir = Path(tmp) / 'out'
+        outdir.mkdir()
+        t0 = time.perf_counter()
+        tarball = tarball_create(str(target), dstdir=str(outdir), delete_target=True, **kwargs)
+        created = time.perf_counter()
+        tarball_restore(tarball)
+        restored = time.perf_counter()
+        return {'create_s': created - t0, 'restore_s': restored - created, 'bytes': os.path.getsize(tarball)}
+
+def bench_many(ntargets: int, nfiles: int, size: int) -> dict:
+    """return time of archiving many trees serially and with tarball_create_many"""
+    out = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        targets = []
+        for i in range(ntargets):
+            root = Path(tmp) / f'run{i}'
+            root.mkdir()
+            targets.append(str(make_tree(root, nfiles, size, ndirs=4)))
+        outdir = Path(tmp) / 'out'
+        outdir.mkdir()
+        t0 = time.perf_counter()
+        for target in targets:
+            tarball_create(target, dstdir=str(outdir), suffix='serial')
+        out['serial_s'] = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        tarball_create_many(targets, dstdir=str(outdir), suffix='many')
+        out['many_s'] = time.perf_counter() - t0
+    return out
+
+def bench_extract_member(nfiles: int, size: int) -> dict:
+    """return time of extracting the last file member with and without sidecar index"""
+    with tempfile.TemporaryDirectory() as tmp:
+        target = make_tree(Path(tmp), nfiles, size)
+        tarball = tarball_create(str(target), dstdir=tmp, index=True)
+        names = [n for n in tarball_list(tarball) if n.endswith('.txt')]
+        t0 = time.perf_counter()
+        tarball_extract_member(tarball, names[-1])
+        indexed = time.perf_counter() - t0
+        os.remove(tarball + TARBALL_INDEX_SUFFIX)
+        t0 = time.perf_counter()
+        tarball_extract_member(tarball, names[-1])
+        return {'indexed_s': indexed, 'stream_s': time.perf_counter() - t0}
+
+def bench_chmod_delete(nfiles: int) -> dict:
+    """return time of recursive_chmod (change and no-op) and force_rmtree on a tree of empty files"""
+    out = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        target = Path(tmp) / 'tree'
+        for i in range(nfiles):
+            d = target / f'dir{i % 20}' / f'sub{i % 7}'
+            d.mkdir(parents=True, exist_ok=True)
+            (d / f'file{i}').touch()
+        for name, mode in [('recursive_chmod_s', 'go-rwx'), ('recursive_chmod_noop_s', 'go-rwx')]:
+            t0 = time.perf_counter()
+            recursive_chmod(str(target), mode)
+            out[name] = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        force_rmtree(str(target))
+        out['force_rmtree_s'] = time.perf_counter() - t0
+    return out
+
+def run(quick: bool = False) -> dict:
+    """run tarball benchmarks on many small files and a few large files"""
+    trees = {
+        'small_files': (2000, 4096) if quick else (20000, 4096),
+        'large_files': (4, 8 << 20) if quick else (16, 32 << 20),
+    }
+    ## current single-threaded path and parallel block compression per codec
+    variants = {
+        'gz': {},
+        'gz_parallel': {'jobs': 0},
+        'bz2_parallel': {'codec': 'bz2', 'jobs': 0},
+        'xz_parallel': {'codec': 'xz', 'level': 1, 'jobs': 0},
+    }
+    try:
+        _zstd_module()
+        variants['zstd_parallel'] = {'codec': 'zstd', 'jobs': 0}
+    except ImportError:
+        pass
+    out = {}
+    for name, (nfiles, size) in trees.items():
+        for variant, kwargs in variants.items():
+            if variant != 'gz' and name != 'large_files':
+                continue
+            prefix = f'tarball_{name}' if variant == 'gz' else f'tarball_{name}_{variant}'
+            for k, v in bench_tree(nfiles, size, **kwargs).items():
+                out[f'{prefix}_{k}'] = v
+    for k, v in bench_many(*((8, 50, 1 << 16) if quick else (64, 200, 1 << 16))).items():
+        out[f'tarball_many_{k}'] = v
+    for k, v in bench_extract_member(*((500, 1 << 16) if quick else (4000, 1 << 16))).items():
+        out[f'tarball_extract_member_{k}'] = v
+    out.update(bench_chmod_delete(5000 if quick else 100000))
+    return out
+
+if __name__ == '__main__':
+    print(json.dumps(run('--quick' in sys.argv), indent=2))
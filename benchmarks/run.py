@@ -0,0 +1,80 @@
+## benchmark runner
+"""run benchmark suites and write or compare machine-readable results
+
+    python benchmarks/run.py --output results.json
+    python benchmarks/run.py --quick --suite config --compare results.json
+"""
+import argparse
+import contextlib
+import datetime
+import importlib
+import json
+import platform
+import subprocess
+import sys
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR))
+
+SUITES = ['startup', 'config', 'configfile', 'logger', 'tarball']
+
+def metadata() -> dict:
+    """return environment description of results"""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=BENCH_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'time': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'commit': commit,
+    }
+
+def run_suites(suites: list, quick: bool) -> dict:
+    """run suites and return results keyed by metric name"""
+    results = {}
+    for suite in suites:
+        module = importlib.import_module(f'bench_{suite}')
+        print(f'running {suite}', file=sys.stderr)
+        ## keep stdout for the JSON report
+        with contextlib.redirect_stdout(sys.stderr):
+            results.update(module.run(quick=quick))
+    return results
+
+def compare(results: dict, baseline: dict) -> str:
+    """return table of ratios to baseline results
+
+    ratio > 1 means larger value than baseline (slower for *_s, faster for *_per_s)
+    """
+    lines = [f'{"metric":48s} {"baseline":>14s} {"current":>14s} {"ratio":>8s}']
+    for name, value in results.items():
+        base = baseline.get(name)
+        if not isinstance(base, (int, float)) or not base:
+            continue
+        lines.append(f'{name:48s} {base:14.6g} {value:14.6g} {value / base:8.3f}')
+    return '\n'.join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description='run subcommand framework benchmarks')
+    parser.add_argument('--suite', action='append', choices=SUITES, help='suite to run (default: all)')
+    parser.add_argument('--quick', action='store_true', help='smaller problem sizes')
+    parser.add_argument('--output', metavar='FILE', help='write JSON results to FILE (default: stdout)')
+    parser.add_argument('--compare', metavar='FILE', help='compare with JSON results of FILE')
+    args = parser.parse_args()
+
+    report = {'meta': metadata(), 'results': run_suites(args.suite or SUITES, args.quick)}
+    out = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(out + '\n')
+    else:
+        print(out)
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        print(compare(report['results'], baseline.get('results', {})), file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+## synthetic package generator for benchmarks
+"""build runnable packages with many subcommand modules"""
+import shutil
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parents[1]
+
+MODULE_TEMPLATE = '''from dataclasses import dataclass
+from args import CustomHelpFormatter
+from config import config
+
+@dataclass
+class ConfigCmd{index}:
+{fields}
+config.append_config(ConfigCmd{index})
+
+def register_subcommand(subparsers, parent_parsers):
+    parser = subparsers.add_parser(
+        'cmd{index}',
+        help='synthetic subcommand {index}',
+        formatter_class=CustomHelpFormatter,
+        parents=parent_parsers
+    )
+    parser.set_defaults(handler=cmd)
+    group = parser.add_argument_group('cmd{index} options')
+{arguments}
+
+def cmd(args):
+    return None
+'''
+
+def make_module(index: int, nfields: int = 5) -> str:
+    """return source of synthetic subcommand module"""
+    fields = '\n'.join(f'    cmd{index}_opt{i}: int = {i}' for i in range(nfields))
+    arguments = '\n'.join(
+        f"    group.add_argument('--opt{i}', dest='cmd{index}_opt{i}', type=int, default={i}, help='option {i}')"
+        for i in range(nfields)
+    )
+    return MODULE_TEMPLATE.format(index=index, fields=fields, arguments=arguments)
+
+def make_package(root: Path, nmodules: int, nfields: int = 5, package: dict | None = None) -> Path:
+    """create package directory with nmodules subcommand modules, return package directory"""
+    pkg = Path(root) / f'synthetic{nmodules}'
+    if pkg.exists():
+        shutil.rmtree(pkg)
+    (pkg / 'subcommand').mkdir(parents=True)
+    for f in REPO_DIR.glob('*.py'):
+        shutil.copyfile(f, pkg / f.name)
+    shutil.copyfile(REPO_DIR / 'template' / 'package_config.py', pkg / 'package_config.py')
+    (pkg / 'subcommand' / '__init__.py').write_text('')
+    for i in range(nmodules):
+        (pkg / 'subcommand' / f'cmd{i}.py').write_text(make_module(i, nfields))
+    lines = ['package:', f'  prog: synthetic{nmodules}', '  version: 1.0.0', '  description: synthetic package']
+    for k, v in (package or {}).items():
+        lines.append(f'  {k}: {str(v).lower() if isinstance(v, bool) else v}')
+    lines.append('  subcommand_modules:')
+    lines += [f'    - cmd{i}' for i in range(nmodules)]
+    (pkg / 'package_config.yaml').write_text('\n'.join(lines) + '\n')
+    return pkg
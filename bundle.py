@@ -0,0 +1,99 @@
+## single-file package bundle
+"""zipapp (.pyz) bundle of a package and access to files inside it
+
+a bundle holds the package sources, package config, data files and legacy
+location .pyc files (the only bytecode zipimport uses) and runs as
+`python bundle.pyz ...`; package_dir is then <bundle.pyz> and files below it
+are read through package_file()
+"""
+import os
+import stat
+from pathlib import Path
+
+BUNDLE_SUFFIX = '.pyz'
+BUNDLE_INTERPRETER = '/usr/bin/env python3'
+
+def bundle_archive(path: Path) -> Path | None:
+    """return bundle (zip file) containing path, None for a regular path"""
+    path = Path(path)
+    if path.exists():
+        if not path.is_file() or path.suffix != BUNDLE_SUFFIX:
+            return None
+        import zipfile
+        return path if zipfile.is_zipfile(path) else None
+    import zipfile
+    for parent in path.parents:
+        if parent.exists():
+            if parent.is_file() and zipfile.is_zipfile(parent):
+                return parent
+            return None
+    return None
+
+def package_file(path: Path):
+    """return Path, or zipfile.Path for a path inside a bundle (both have open/read_bytes/is_file)"""
+    path = Path(path)
+    archive = bundle_archive(path) if not path.exists() else None
+    if archive is None:
+        return path
+    import zipfile
+    return zipfile.Path(archive, path.relative_to(archive).as_posix())
+
+def read_package_file(path: Path) -> tuple:
+    """return (data, size, mtime_ns) of file, inside a bundle mtime is the bundle's"""
+    try:
+        with open(path, 'rb') as f:
+            st = os.fstat(f.fileno())
+            return f.read(), st.st_size, st.st_mtime_ns
+    except (FileNotFoundError, NotADirectoryError):
+        archive = bundle_archive(path)
+        if archive is None:
+            raise
+    data = package_file(path).read_bytes()
+    return data, len(data), os.stat(archive).st_mtime_ns
+
+def build_bundle(package_dir: Path, output: Path, files: list,
+                 invalidation_mode: str = 'unchecked-hash', compressed: bool = False,
+                 interpreter: str | None = BUNDLE_INTERPRETER) -> Path:
+    """write executable bundle of files (relative to package_dir) atomically
+
+    every .py file gets a .pyc next to it (compiled by the running interpreter,
+    zipimport falls back to the source for other Python versions); a bundle is
+    immutable, so unchecked-hash pycs skip source validation at import
+    (invalidation_mode none: no pycs)
+    the pycs are always optimization level 0: zipimport loads legacy location
+    pycs whatever -O the bundle runs with, so optimized ones would strip asserts
+    and docstrings from normal runs (under -O asserts are kept instead)
+    stored (uncompressed) members are the fastest to import
+    """
+    import py_compile
+    import tempfile
+    import zipfile
+    package_dir = Path(package_dir)
+    output = Path(output)
+    mode = None
+    if invalidation_mode not in (None, 'none'):
+        mode = py_compile.PycInvalidationMode[invalidation_mode.upper().replace('-', '_')]
+    compression = zipfile.ZIP_DEFLATED if compressed else zipfile.ZIP_STORED
+    tmpfile = output.with_name(f'.{output.name}.{os.getpid()}.tmp')
+    try:
+        with open(tmpfile, 'wb') as f, tempfile.TemporaryDirectory() as tmp:
+            if interpreter:
+                f.write(f'#!{interpreter}\n'.encode('utf-8'))
+            with zipfile.ZipFile(f, 'w', compression) as z:
+                for bn in sorted(Path(p) for p in files):
+                    src = package_dir / bn
+                    z.write(src, bn.as_posix())
+                    if bn.suffix == '.py' and mode is not None:
+                        cfile = Path(tmp) / 'module.pyc'
+                        py_compile.compile(
+                            str(src), cfile=str(cfile), dfile=str(output / bn),
+                            doraise=True, optimize=0, invalidation_mode=mode
+                        )
+                        z.write(cfile, bn.with_suffix('.pyc').as_posix())
+        if interpreter:
+            os.chmod(tmpfile, os.stat(tmpfile).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+        os.replace(tmpfile, output)
+    except BaseException:
+        tmpfile.unlink(missing_ok=True)
+        raise
+    return output
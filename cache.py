@@ -0,0 +1,76 @@
+## on-disk cache helpers
+"""cache directory, file fingerprints and pickle cache files"""
+import hashlib
+import os
+import pickle
+from pathlib import Path
+from typing import Any
+
+CACHE_DIR_ENV = 'SUBCOMMAND_CACHE_DIR'
+CACHE_DIR_NAME = 'subcommand_framework'
+
+def cache_dir(name: str | None = None) -> Path | None:
+    """return cache directory, None if caching is disabled
+
+    SUBCOMMAND_CACHE_DIR overrides the location and an empty value disables caching,
+    otherwise $XDG_CACHE_HOME/subcommand_framework (~/.cache/subcommand_framework) is used
+    """
+    base = os.environ.get(CACHE_DIR_ENV)
+    if base is None:
+        xdg = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        base = os.path.join(xdg, CACHE_DIR_NAME)
+    elif base == '':
+        return None
+    path = Path(base)
+    if name:
+        path = path / name
+    return path
+
+def file_digest(data: bytes) -> str:
+    """return content hash"""
+    return hashlib.sha256(data).hexdigest()
+
+def file_fingerprint(path: Path | None) -> tuple | None:
+    """return (path, size, mtime, content hash) of file, None if not readable"""
+    if path is None:
+        return None
+    try:
+        st = os.stat(path)
+        with open(path, 'rb') as f:
+            digest = file_digest(f.read())
+    except OSError:
+        return None
+    return (str(path), st.st_size, st.st_mtime_ns, digest)
+
+def cache_key(*parts: Any) -> str:
+    """return hash key of arbitrary repr-able parts"""
+    return hashlib.sha256(repr(parts).encode('utf-8')).hexdigest()
+
+def load_cache(cache_file: Path | None) -> Any:
+    """load pickled cache file, None if missing or broken"""
+    if cache_file is None:
+        return None
+    try:
+        with open(cache_file, 'rb') as f:
+            return pickle.load(f)
+    except Exception:
+        return None
+
+def store_cache(cache_file: Path | None, data: Any) -> bool:
+    """store data to cache file atomically, return False on failure"""
+    if cache_file is None:
+        return False
+    cache_file = Path(cache_file)
+    tmpfile = cache_file.with_name(f'{cache_file.name}.{os.getpid()}.tmp')
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmpfile, 'wb') as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmpfile, cache_file)
+    except Exception:
+        try:
+            tmpfile.unlink(missing_ok=True)
+        except OSError:
+            pass
+        return False
+    return True
@@ -0,0 +1,102 @@
+## thin client of the warm server
+"""forward an invocation to a server started with `--serve SOCKET`
+
+argv, cwd, environment, umask and the stdio file descriptors are passed over
+the Unix socket and the exit status of the request is returned; socket and
+signal are imported on use, so checking for a server costs next to nothing
+"""
+import json
+import os
+import sys
+
+SERVER_ENV = 'SUBCOMMAND_SERVER'
+SERVE_OPTION = '--serve'
+## options of invocations which always run locally
+LOCAL_OPTIONS = (SERVE_OPTION, '--batch')
+## signals forwarded to the process running the request
+FORWARD_SIGNALS = ('SIGINT', 'SIGTERM', 'SIGHUP', 'SIGQUIT')
+
+def strip_option(argv: list, option: str) -> list:
+    """return argv without "option VALUE" and "option=VALUE" """
+    out = []
+    skip = False
+    for arg in argv:
+        if skip:
+            skip = False
+        elif arg == option:
+            skip = True
+        elif not arg.startswith(option + '='):
+            out.append(arg)
+    return out
+
+def send_message(sock, message: dict, fds=()) -> None:
+    """send newline delimited JSON message (and file descriptors)"""
+    data = json.dumps(message).encode('utf-8') + b'\n'
+    if fds:
+        import socket
+        data = data[socket.send_fds(sock, [data], list(fds)):]
+    sock.sendall(data)
+
+def recv_message(sock, buf: bytearray) -> dict | None:
+    """return next message, None at end of stream (buf keeps data already received)"""
+    while True:
+        i = buf.find(b'\n')
+        if i >= 0:
+            line = bytes(buf[:i])
+            del buf[:i + 1]
+            return json.loads(line)
+        chunk = sock.recv(65536)
+        if not chunk:
+            return None
+        buf += chunk
+
+def forward(socket_path: str, argv: list | None = None) -> int | None:
+    """run argv on the server, return exit status or None if it has to run locally
+
+    None is returned if no server listens on socket_path or the server declines
+    the request (different user config file, changed package files)
+    """
+    import signal
+    import socket
+    if argv is None:
+        argv = sys.argv[1:]
+    root = argv[:argv.index('--')] if '--' in argv else argv
+    if any(a == o or a.startswith(o + '=') for a in root for o in LOCAL_OPTIONS):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    with sock:
+        try:
+            sock.connect(socket_path)
+            umask = os.umask(0)
+            os.umask(umask)
+            request = {'argv': argv, 'cwd': os.getcwd(), 'env': dict(os.environ), 'umask': umask}
+            send_message(sock, request, fds=(0, 1, 2))
+            buf = bytearray()
+            reply = recv_message(sock, buf)
+        except (OSError, ValueError):
+            return None
+        if reply is None or 'pid' not in reply:
+            return None
+
+        ## forward signals to the process running the request until it exits
+        pid = reply['pid']
+        def forward_signal(signum, frame):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+        handlers = {}
+        for name in FORWARD_SIGNALS:
+            signum = getattr(signal, name, None)
+            if signum is not None:
+                handlers[signum] = signal.signal(signum, forward_signal)
+        try:
+            reply = recv_message(sock, buf)
+        except (OSError, ValueError):
+            reply = None
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+    if reply is None: # request process died
+        return 1
+    return reply['exit']
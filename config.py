@@ -1,18 +1,66 @@
+from collections import ChainMap
+from collections.abc import Mapping, Set
+from copy import deepcopy
 from dataclasses import is_dataclass, asdict, field, fields, make_dataclass, MISSING
+from types import MappingProxyType
 from typing import Type, TypeVar, Any, Optional, Tuple, Dict
 
 ConfigT = TypeVar('ConfigT')
 
+## composed config classes by field signature, shared in the process
+_SCHEMA_CACHE: Dict[tuple, type] = {}
+
+def compose_schema(merged: Dict[str, Any], name: str = 'MergedConfig', slots: bool = False, frozen: bool = False) -> type:
+    """return kw_only dataclass with merged fields, reusing class of identical signature"""
+    ## type of default too, equal defaults 0, False and 0.0 must not share a class
+    signature = (name, slots, frozen, *((n, f.type, type(f.default), f.default, f.default_factory) for n, f in merged.items()))
+    try:
+        return _SCHEMA_CACHE[signature]
+    except KeyError:
+        pass
+    except TypeError: # unhashable type or default
+        signature = None
+
+    spec = []
+    for fname, f in merged.items():
+        ftype = f.type
+        if f.default is not MISSING:
+            spec.append((fname, ftype, field(default=f.default)))
+        elif f.default_factory is not MISSING:
+            spec.append((fname, ftype, field(default_factory=f.default_factory)))
+        else:
+            spec.append((fname, ftype))
+    composed = make_dataclass(name, spec, kw_only=True, slots=slots, frozen=frozen)
+    if signature is not None:
+        _SCHEMA_CACHE[signature] = composed
+    return composed
+
+def freeze_value(value: Any) -> Any:
+    """return immutable counterpart of container values (dict, list, set)"""
+    if isinstance(value, Mapping):
+        return MappingProxyType({k: freeze_value(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze_value(v) for v in value)
+    if isinstance(value, Set):
+        return frozenset(value)
+    return value
+
 class GlobalConfig:
     """
     GlobalConfig class
     support dataclass only
     """
     _instance: Optional[Any] = None
+    _keys: Tuple[str, ...] = ()              # field names in definition order
+    _field_names: frozenset = frozenset()   # field names for O(1) lookup
+    _pending: list = []                      # schema fragments not composed yet
+    _slots: bool = False                     # compose slotted classes
 
     @classmethod
     def _has_instance(cls) -> bool:
         """check if _instance is None"""
+        if cls._pending:
+            cls._compose_pending()
         return cls._instance is not None
 
     @classmethod
@@ -21,10 +69,18 @@ class GlobalConfig:
         if not cls._has_instance():
             raise RuntimeError('GlobalConfig not initialized')
 
+    @classmethod
+    def _index_fields(cls) -> None:
+        """rebuild field name index of current instance"""
+        cls._keys = tuple(f.name for f in fields(cls._instance)) if cls._instance is not None else ()
+        cls._field_names = frozenset(cls._keys)
+
     @classmethod
     def _ensure_field(cls, key: str) -> None:
-        cls._init_check()
-        if not any(f.name == key for f in fields(cls._instance)):
+        if key not in cls._field_names:
+            cls._init_check()
+            if key in cls._field_names: # added by pending schema
+                return
             raise AttributeError(f'Unknown dataclass field: {key!r}')
 
     @classmethod
@@ -36,14 +92,14 @@ class GlobalConfig:
     @classmethod
     def is_valid(cls) -> bool:
         """return True if valid"""
-        return cls._instance is not None and is_dataclass(cls._instance)
+        return cls._has_instance() and is_dataclass(cls._instance)
 
     @classmethod
     def count(cls) -> int:
         """return number of fields"""
         if not cls._has_instance():
             return 0
-        return len(cls._current_dict())
+        return len(cls._keys)
 
     @classmethod
     def is_empty(cls) -> bool:
@@ -74,7 +130,9 @@ class GlobalConfig:
         """set local config instance"""
         if not is_dataclass(config):
             raise TypeError('set_config expects a dataclass instance')
+        cls._pending = []
         cls._instance = config
+        cls._index_fields()
 
     @classmethod
     def get_config(cls) -> ConfigT:
@@ -82,75 +140,211 @@ class GlobalConfig:
         cls._init_check()
         return cls._instance
 
+    @classmethod
+    def set_slots(cls, enabled: bool = True) -> None:
+        """compose slotted classes in extend_schema (applied on next composition)"""
+        cls._slots = enabled
+
+    @classmethod
+    def freeze(cls) -> Any:
+        """return immutable slotted snapshot of current config
+
+        containers are converted recursively (dict to read-only mapping, list to tuple,
+        set to frozenset) so the snapshot can be shared between threads
+        """
+        cls._init_check()
+        merged = {f.name: f for f in fields(cls._instance)}
+        FrozenConfig = compose_schema(merged, name='FrozenConfig', slots=True, frozen=True)
+        return FrozenConfig(**{k: freeze_value(getattr(cls._instance, k)) for k in cls._keys})
+
+    @classmethod
+    def snapshot(cls) -> tuple:
+        """return (config class, deep copy of field values) to restore the config later"""
+        cls._init_check()
+        return (type(cls._instance), deepcopy({k: getattr(cls._instance, k) for k in cls._keys}))
+
+    @classmethod
+    def restore(cls, snapshot: tuple) -> None:
+        """replace config by a new instance of snapshot (values are copied again)"""
+        config_class, values = snapshot
+        cls.set_config(config_class(**deepcopy(values)))
+
     @classmethod
     def reset(cls) -> None:
         """clear GlobalConfig"""
+        cls._pending = []
         cls._instance = None
+        cls._index_fields()
 
     @classmethod
     def keys(cls) -> Tuple[str, ...]:
         """return all keys stored in GlobalConfig"""
-        data = cls._current_dict()
-        return tuple(data.keys())
+        cls._init_check()
+        return cls._keys
 
     @classmethod
-    def values(cls) -> Tuple[str, ...]:
-        """return all values stored in GlobalConfig"""
-        data = cls._current_dict()
-        return tuple(data.values())
+    def values(cls) -> Tuple[Any, ...]:
+        """return all values stored in GlobalConfig (not copied)"""
+        cls._init_check()
+        return tuple(getattr(cls._instance, k) for k in cls._keys)
 
     @classmethod
-    def items(cls) -> Tuple[str, ...]:
-        """return all combinations of keys and values stored in GlobalConfig"""
-        data = cls._current_dict()
-        return tuple(data.items())
+    def items(cls) -> Tuple[Tuple[str, Any], ...]:
+        """return all combinations of keys and values stored in GlobalConfig (not copied)"""
+        cls._init_check()
+        return tuple((k, getattr(cls._instance, k)) for k in cls._keys)
+
+    @classmethod
+    def view(cls) -> 'ConfigView':
+        """return read-only live mapping of GlobalConfig"""
+        return ConfigView()
+
+    @classmethod
+    def command_defaults(cls, name: str, args: Any = None) -> 'LayeredConfig':
+        """return defaults of subcommand name without copying
+
+        layers: config fields < command.<name> section of params (user over package) < cli (vars(args))
+        """
+        cls._init_check()
+        params = getattr(cls._instance, 'params', None) if 'params' in cls._field_names else None
+        layers = [('config', ConfigView()), (f'command.{name}', LayeredConfig.of(params).section('command', name))]
+        if args is not None:
+            layers.append(('cli', vars(args)))
+        return LayeredConfig(layers)
 
     @classmethod
     def extend_schema(cls, *schema_classes: Type[Any], prefer_existing: bool = True):
         """append specific dataclass fields
             - prefer_existing: True to prioritize existed schema
+        fragments are queued and composed into one class on next access
         """
         if not schema_classes:
             return
+        for sc in schema_classes:
+            if not is_dataclass(sc):
+                raise TypeError('extend_schema expects dataclass types')
+        cls._pending = [*cls._pending, (schema_classes, prefer_existing)]
 
+    @classmethod
+    def _compose_pending(cls) -> None:
+        """compose queued schema fragments with current instance"""
+        pending, cls._pending = cls._pending, []
         current_values: Dict[str, Any] = {}
-        current_fields: Dict[str, Any] = {}
-        if cls._has_instance():
-            current_values = asdict(cls._instance)
+        merged: Dict[str, Any] = {}
+        if cls._instance is not None:
             for f in fields(cls._instance):
-                current_fields[f.name] = f
+                merged[f.name] = f
+                current_values[f.name] = getattr(cls._instance, f.name)
 
-        merged: Dict[str, Any] = dict(current_fields)
-        for sc in schema_classes:
-            if not is_dataclass(sc):
-                raise TypeError('extend_schema expects dataclass types')
-            for f in fields(sc):
-                if f.name in merged:
-                    if not prefer_existing:
+        for schema_classes, prefer_existing in pending:
+            for sc in schema_classes:
+                for f in fields(sc):
+                    if f.name not in merged or not prefer_existing:
                         merged[f.name] = f
-                else:
-                    merged[f.name] = f
-
-        spec = []
-        for name, f in merged.items():
-            ftype = f.type
-            if f.default is not MISSING:
-                spec.append((name, ftype, field(default=f.default)))
-            elif f.default_factory is not MISSING:
-                spec.append((name, ftype, field(default_factory=f.default_factory)))
-            else:
-                spec.append((name, ftype))
-
-        MergedConfig = make_dataclass('MergedConfig', spec, kw_only=True)
-
-        init_kwargs = {}
-        for f in fields(MergedConfig):
-            if f.name in current_values:
-                init_kwargs[f.name] = current_values[f.name]
-            else:
-                pass
-
-        cls._instance = MergedConfig(**init_kwargs)
+
+        MergedConfig = compose_schema(merged, slots=cls._slots)
+        cls._instance = MergedConfig(**current_values)
+        cls._index_fields()
+
+class ConfigView(Mapping):
+    """read-only mapping view of GlobalConfig without copying values"""
+    __slots__ = ()
+    def __getitem__(self, key: str) -> Any:
+        if key not in GlobalConfig._field_names and key not in GlobalConfig.keys():
+            raise KeyError(key)
+        return getattr(GlobalConfig._instance, key)
+    def __iter__(self):
+        return iter(GlobalConfig.keys())
+    def __len__(self) -> int:
+        return GlobalConfig.count()
+    def __contains__(self, key) -> bool:
+        return key in GlobalConfig._field_names or key in GlobalConfig.keys()
+    def __repr__(self) -> str:
+        return f'<ConfigView: {len(self)} fields>'
+
+class LayeredConfig(Mapping):
+    """read-only mapping resolving keys through named layers without copying
+
+    layers are given lowest priority first (e.g. package, user, command.<name>, cli)
+    and lookups go through a ChainMap of the layer mappings themselves
+    """
+    __slots__ = ('_names', '_chain')
+    def __init__(self, layers=()):
+        layers = [(name, {} if mapping is None else mapping) for name, mapping in layers]
+        self._names = tuple(name for name, _ in reversed(layers))
+        self._chain = ChainMap(*(mapping for _, mapping in reversed(layers)))
+
+    @classmethod
+    def of(cls, mapping: Mapping | None, name: str = 'package') -> 'LayeredConfig':
+        """return mapping as LayeredConfig, a plain mapping becomes its single layer"""
+        if isinstance(mapping, LayeredConfig):
+            return mapping
+        return cls([(name, mapping)])
+
+    def __getitem__(self, key: str) -> Any:
+        return self._chain[key]
+    def __iter__(self):
+        return iter(self._chain)
+    def __len__(self) -> int:
+        return len(self._chain)
+    def __contains__(self, key) -> bool:
+        return key in self._chain
+    def __repr__(self) -> str:
+        return f'<LayeredConfig: {" > ".join(self._names)}>'
+
+    def __copy__(self):
+        return self
+    def __deepcopy__(self, memo):
+        """copy layers too, their nested values are mutable (GlobalConfig.snapshot)"""
+        layered = LayeredConfig.__new__(LayeredConfig)
+        memo[id(self)] = layered
+        layered._names = self._names
+        layered._chain = ChainMap(*deepcopy(self._chain.maps, memo))
+        return layered
+
+    @property
+    def layers(self) -> Tuple[str, ...]:
+        """return layer names, highest priority first"""
+        return self._names
+
+    def layer(self, name: str) -> Mapping:
+        """return mapping of layer"""
+        try:
+            return self._chain.maps[self._names.index(name)]
+        except ValueError:
+            raise KeyError(name) from None
+
+    def source(self, key: str) -> str | None:
+        """return name of layer supplying value of key, None if missing"""
+        for name, mapping in zip(self._names, self._chain.maps):
+            if key in mapping:
+                return name
+        return None
+
+    def sources(self) -> Dict[str, str]:
+        """return layer name supplying each key"""
+        return {key: self.source(key) for key in self}
+
+    def with_layer(self, name: str, mapping: Mapping | None) -> 'LayeredConfig':
+        """return new LayeredConfig with mapping on top (layers are shared, not copied)"""
+        layered = LayeredConfig.__new__(LayeredConfig)
+        layered._names = (name, *self._names)
+        layered._chain = self._chain.new_child({} if mapping is None else mapping)
+        return layered
+
+    def section(self, *path: str) -> 'LayeredConfig':
+        """return LayeredConfig of nested section path in every layer having it"""
+        layers = []
+        for name, mapping in zip(reversed(self._names), reversed(self._chain.maps)):
+            for key in path:
+                mapping = mapping.get(key) if isinstance(mapping, Mapping) else None
+            if isinstance(mapping, Mapping):
+                layers.append((name, mapping))
+        return LayeredConfig(layers)
+
+    def to_dict(self) -> dict:
+        """export merged top-level keys to dict (copy)"""
+        return dict(self._chain)
 
 class _ConfigProxy:
     """proxy class to GlobalConfig for syntax sugar"""
@@ -169,6 +363,8 @@ class _ConfigProxy:
     ## accessing field via attribute
     def __getattr__(self, name: str):
         """get field"""
+        if name in GlobalConfig._field_names:
+            return getattr(GlobalConfig._instance, name)
         return GlobalConfig.get(name)
     def __setattr__(self, name: str, value: Any):
         """set field"""
@@ -184,12 +380,24 @@ class _ConfigProxy:
     def items(self):
         """return all combinations of keys and values stored in GlobalConfig"""
         return GlobalConfig.items()
+    def view(self):
+        """return read-only live mapping of GlobalConfig"""
+        return GlobalConfig.view()
+
+    def command_defaults(self, name: str, args=None):
+        """return layered defaults of subcommand name (config < command.<name> < cli)"""
+        return GlobalConfig.command_defaults(name, args)
 
     ## alias to extend_schema
     def append_config(self, config_class: ConfigT):
         """append one dataclass schema to GlobalConfig"""
         return GlobalConfig.extend_schema(config_class)
 
+    ## immutable snapshot
+    def freeze(self):
+        """return immutable slotted snapshot of GlobalConfig"""
+        return GlobalConfig.freeze()
+
     ## convert to dict
     def to_dict(self):
         """export to dict"""
@@ -1,46 +1,230 @@
-from dataclasses import dataclass, fields, asdict
-from pathlib import Path, PosixPath
-import yaml
-from typing import Type
+from collections.abc import Iterable, Mapping
+from dataclasses import dataclass, fields, is_dataclass, MISSING
+from pathlib import Path
+import functools
+from types import UnionType
+from typing import Any, Literal, Type, TypeVar, Union, get_args, get_origin, get_type_hints
+from bundle import package_file, read_package_file
+from cache import cache_dir, cache_key, file_digest, load_cache, store_cache
 from config import ConfigT
 
 PACKAGE_CONFIG_FILE = 'package_config.yaml'
 
+@functools.cache
+def yaml_loader():
+    """return C-accelerated loader if PyYAML is built with libyaml (yaml is imported on first use)"""
+    import yaml
+    return getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+def yaml_cache_file(path: Path) -> Path | None:
+    """return cache file of parsed YAML document, None if caching is disabled"""
+    base = cache_dir('yaml')
+    if base is None:
+        return None
+    return base / f'{cache_key(str(Path(path).absolute()))}.pickle'
+
+def load_yaml(path: Path, use_cache: bool = True) -> Any:
+    """load YAML file through parsed document cache
+
+    cached document is valid while size, mtime and content hash of the file match
+    (files inside a bundle are read from the bundle)
+    """
+    data, size, mtime_ns = read_package_file(path)
+    fingerprint = (size, mtime_ns, file_digest(data))
+    cache_file = yaml_cache_file(path) if use_cache else None
+    cached = load_cache(cache_file)
+    if isinstance(cached, dict) and cached.get('fingerprint') == fingerprint:
+        return cached['document']
+    import yaml
+    document = yaml.load(data, Loader=yaml_loader())
+    store_cache(cache_file, {'fingerprint': fingerprint, 'document': document})
+    return document
+
 def load_package_config(package_dir: Path) -> dict:
     """load package configuration file"""
     package_config_file = package_dir / Path(PACKAGE_CONFIG_FILE)
-    if not package_config_file.is_file():
+    if not package_file(package_config_file).is_file():
         raise FileExistsError(f'no package config file {package_config_file}')
     package_config = {}
-    with package_config_file.open('r', encoding='utf-8') as f:
-        data = yaml.safe_load(f) or {}
-        if not isinstance(data, dict):
-            raise ValueError('top-level YAML must be a mapping/dict')
-        package_config.update(data)
+    data = load_yaml(package_config_file) or {}
+    if not isinstance(data, dict):
+        raise ValueError('top-level YAML must be a mapping/dict')
+    package_config.update(data)
     return package_config
 
-def initialize_params(config: Type[ConfigT], params: dict | None) -> dict:
-    """initialize parameter by defined type in config"""
-    config_params = asdict(config())
-    if params:
-        for f in fields(config):
-            if f.name in params:
-                ftype = type(config_params[f.name])
-                value = params[f.name]
+## accepted spellings of bool parameters
+BOOL_STRINGS = {
+    'true': True, 'yes': True, 'on': True, '1': True,
+    'false': False, 'no': False, 'off': False, '0': False, '': False
+}
+
+class ParamsValidationError(ValueError):
+    """parameters not convertible to declared types, errors lists every failure"""
+    def __init__(self, errors: list, records: dict | None = None):
+        self.errors = list(errors)
+        self.records = records or {} # index of failed record: its error (initialize_params_many)
+        super().__init__('; '.join(self.errors))
+
+def _type_name(tp) -> str:
+    return getattr(tp, '__name__', None) or repr(tp)
+
+def _to_bool(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str) and value.strip().lower() in BOOL_STRINGS:
+        return BOOL_STRINGS[value.strip().lower()]
+    raise ValueError(f'cannot convert {value!r} to bool')
+
+def _converter(tp):
+    """return function converting a value to annotation tp"""
+    origin, args = get_origin(tp), get_args(tp)
+    if tp is Any or tp is object or isinstance(tp, (str, TypeVar)):
+        return lambda value: value
+    if origin in (Union, UnionType):
+        optional = type(None) in args
+        converters = [_converter(a) for a in args if a is not type(None)]
+        def convert(value):
+            if value is None and optional:
+                return None
+            for c in converters:
                 try:
-                    if ftype == int:
-                        value = int(value)
-                    elif ftype == float:
-                        value = float(value)
-                    elif ftype == str:
-                        value = str(value)
-                    elif ftype == list:
-                        value = list(value)
-                    elif ftype == bool:
-                        value = bool(value)
-                    elif ftype == PosixPath:
-                        value = Path(value)
-                except Exception:
+                    return c(value)
+                except (TypeError, ValueError):
                     pass
-                config_params[f.name] = value
-    return config_params
+            raise ValueError(f'cannot convert {value!r} to {" | ".join(map(_type_name, args))}')
+        return convert
+    if origin is Literal:
+        def convert(value):
+            if value not in args:
+                raise ValueError(f'{value!r} is not one of {list(args)}')
+            return value
+        return convert
+    if tp is bool:
+        return _to_bool
+    if origin in (list, set, frozenset) or tp in (list, set, frozenset):
+        container = origin or tp
+        item = _converter(args[0]) if args else None
+        def convert(value):
+            if isinstance(value, (str, bytes, Mapping)) or not isinstance(value, Iterable):
+                raise TypeError(f'cannot convert {type(value).__name__} to {container.__name__}')
+            return container(value if item is None else map(item, value))
+        return convert
+    if origin is tuple or tp is tuple:
+        if not args or args[-1] is Ellipsis:
+            item = _converter(args[0]) if args else None
+        else:
+            items = [_converter(a) for a in args]
+        def convert(value):
+            if isinstance(value, (str, bytes, Mapping)) or not isinstance(value, Iterable):
+                raise TypeError(f'cannot convert {type(value).__name__} to tuple')
+            if not args or args[-1] is Ellipsis:
+                return tuple(value if item is None else map(item, value))
+            value = tuple(value)
+            if len(value) != len(items):
+                raise ValueError(f'expected {len(items)} items, got {len(value)}')
+            return tuple(c(v) for c, v in zip(items, value))
+        return convert
+    if origin in (dict, Mapping) or tp in (dict, Mapping):
+        key, val = (_converter(args[0]), _converter(args[1])) if args else (None, None)
+        def convert(value):
+            if not isinstance(value, Mapping):
+                raise TypeError(f'cannot convert {type(value).__name__} to dict')
+            if key is None:
+                return dict(value)
+            return {key(k): val(v) for k, v in value.items()}
+        return convert
+    if is_dataclass(tp):
+        def convert(value):
+            if isinstance(value, tp):
+                return value
+            if not isinstance(value, Mapping):
+                raise TypeError(f'cannot convert {type(value).__name__} to {tp.__name__}')
+            return tp(**compile_params(tp)(value))
+        return convert
+    if isinstance(tp, type):
+        def convert(value):
+            if type(value) is tp:
+                return value
+            return tp(value)
+        return convert
+    return lambda value: value
+
+class ParamsConverter:
+    """converter of parameter dicts to the field types of a dataclass"""
+    __slots__ = ('config', 'fields')
+    def __init__(self, config: Type[ConfigT]):
+        self.config = config
+        try:
+            hints = get_type_hints(config)
+        except Exception: # unresolvable forward references
+            hints = {}
+        spec = []
+        for f in fields(config):
+            tp = hints.get(f.name, f.type)
+            if isinstance(tp, str) and f.default is not MISSING: # fall back to type of default
+                tp = type(f.default)
+            spec.append((f.name, _converter(tp), f.default, f.default_factory))
+        self.fields = tuple(spec)
+
+    def __call__(self, params: dict | None, strict: bool = True) -> dict:
+        """return converted params with defaults of missing fields
+
+        failed conversions raise ParamsValidationError listing all of them,
+        or keep the given value if not strict
+        """
+        out = {}
+        errors = []
+        for name, convert, default, factory in self.fields:
+            if params and name in params:
+                value = params[name]
+                try:
+                    value = convert(value)
+                except (TypeError, ValueError) as e:
+                    errors.append(f'{name}: {e}')
+            elif default is not MISSING:
+                value = default
+            elif factory is not MISSING:
+                value = factory()
+            else:
+                errors.append(f'{name}: missing')
+                continue
+            out[name] = value
+        if errors and strict:
+            raise ParamsValidationError(errors)
+        return out
+
+@functools.cache
+def compile_params(config: Type[ConfigT]) -> ParamsConverter:
+    """return converter of dataclass built from its annotations (cached per class)"""
+    return ParamsConverter(config)
+
+def initialize_params(config: Type[ConfigT], params: dict | None, strict: bool = False) -> dict:
+    """initialize parameter by defined type in config
+
+    values which cannot be converted are kept as given unless strict
+    (ParamsValidationError)
+    """
+    return compile_params(config)(params, strict)
+
+def initialize_params_many(config: Type[ConfigT], records, return_exceptions: bool = False) -> list:
+    """validate and convert many parameter dicts with the same schema
+
+    return converted dicts in the order of records; errors of all records are
+    collected into one ParamsValidationError (errors prefixed with the record
+    index), with return_exceptions a failed record gives its error instead
+    """
+    convert = compile_params(config)
+    results = []
+    failed = {}
+    for i, params in enumerate(records):
+        try:
+            results.append(convert(params))
+        except ParamsValidationError as e:
+            failed[i] = e
+            results.append(e)
+    if failed and not return_exceptions:
+        errors = [f'[{i}] {msg}' for i, e in failed.items() for msg in e.errors]
+        raise ParamsValidationError(errors, failed)
+    return results
@@ -6,10 +6,24 @@ import os
 import stat
 import shutil
 import glob
+import json
+import shlex
+import subprocess
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from configfile import load_package_config
+from utils import file_hash
+from bundle import BUNDLE_SUFFIX, build_bundle
+
+## pyc invalidation modes of compileall (none: no precompilation)
+PRECOMPILE_MODES = ['none', 'timestamp', 'checked-hash', 'unchecked-hash']
+
+## manifest of installed files in installation directory
+INSTALL_MANIFEST_FILE = '.install-manifest.json'
+## manifest key of the bytecode settings of the installation (not a file)
+INSTALL_MANIFEST_PRECOMPILE = '.precompile'
 
 def create_script(scriptpath, installdir, python_command):
     print(f'Create executable script as {scriptpath}')
@@ -28,9 +42,152 @@ def create_script(scriptpath, installdir, python_command):
     cmode = cmode | stat.S_IRUSR | stat.S_IXUSR
     os.chmod(scriptpath, cmode)
 
+def create_bundle_script(scriptpath, bundle, python_command):
+    print(f'Create executable script as {scriptpath}')
+    script_out =  '#!/bin/sh\n'
+    script_out += f'exec {python_command} "{bundle}" "$@"\n'
+    with open(scriptpath, 'w') as OUT:
+        OUT.write(script_out)
+    cmode = os.stat(scriptpath).st_mode
+    cmode = cmode | stat.S_IRUSR | stat.S_IXUSR
+    os.chmod(scriptpath, cmode)
+
 def testscript(args):
     create_script(f'{args.scriptname}_test', Path.cwd(), args.pythoncmd)
 
+def package_files(package_dir: Path) -> list:
+    """return installed files of package relative to package_dir"""
+    files = glob.glob(f'{package_dir}/*.py')
+    files += glob.glob(f'{package_dir}/subcommand/*.py')
+    files += glob.glob(f'{package_dir}/subcommands/*.py')
+    files += glob.glob(f'{package_dir}/data/**/*', recursive=True)
+    files += glob.glob(f'{package_dir}/*.yaml')
+    return sorted({Path(f).relative_to(package_dir) for f in files if os.path.isfile(f)})
+
+def load_install_manifest(install_dir: Path) -> dict:
+    """return {relative path: [size, mtime_ns, sha256]} of installed files (and bytecode settings)"""
+    try:
+        with open(install_dir / INSTALL_MANIFEST_FILE, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return manifest if isinstance(manifest, dict) else {}
+
+def write_install_manifest(install_dir: Path, manifest: dict):
+    """write manifest of installed files atomically"""
+    manifest_file = install_dir / INSTALL_MANIFEST_FILE
+    tmpfile = manifest_file.with_name(f'.{manifest_file.name}.{os.getpid()}.tmp')
+    with open(tmpfile, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmpfile, manifest_file)
+
+def install_file(src: Path, dst: Path):
+    """copy file atomically (temporary file in destination directory and rename)"""
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmpfile = dst.with_name(f'.{dst.name}.{os.getpid()}.tmp')
+    try:
+        shutil.copyfile(src, tmpfile)
+        os.replace(tmpfile, dst)
+    except BaseException:
+        tmpfile.unlink(missing_ok=True)
+        raise
+
+def sync_files(package_dir: Path, install_dir: Path, files: list, sync: bool = True, jobs: int = None,
+               precompile_settings: dict = None) -> dict:
+    """install files to install_dir, return {copied, skipped, removed} lists
+
+    with sync, files whose size and mtime (or else content hash) match the
+    manifest of the previous installation are skipped and files installed by
+    the previous installation which no longer exist in the package are removed
+    precompile_settings are recorded in the manifest, precompile_changed of the
+    result tells if they differ from the previous installation (bytecode of
+    skipped files is then out of date)
+    """
+    previous = load_install_manifest(install_dir) if sync else {}
+    previous_settings = previous.pop(INSTALL_MANIFEST_PRECOMPILE, None)
+    manifest = {}
+    if precompile_settings is not None:
+        manifest[INSTALL_MANIFEST_PRECOMPILE] = precompile_settings
+    copies = []
+    skipped = []
+    for bn in files:
+        src = package_dir / bn
+        st = os.stat(src)
+        key = bn.as_posix()
+        entry = previous.get(key)
+        if entry is not None and (install_dir / bn).is_file():
+            if entry[:2] == [st.st_size, st.st_mtime_ns]:
+                manifest[key] = entry
+                skipped.append(bn)
+                continue
+            digest = file_hash(src)
+            if entry[2] == digest:
+                ## touched but unchanged content
+                manifest[key] = [st.st_size, st.st_mtime_ns, digest]
+                skipped.append(bn)
+                continue
+        copies.append(bn)
+        manifest[key] = [st.st_size, st.st_mtime_ns, None]
+
+    def copy(bn):
+        digest = file_hash(package_dir / bn)
+        install_file(package_dir / bn, install_dir / bn)
+        return digest
+
+    with ThreadPoolExecutor(jobs or min(32, (os.cpu_count() or 1) + 4)) as executor:
+        for bn, digest in zip(copies, executor.map(copy, copies)):
+            print(f'    Copy {bn}')
+            manifest[bn.as_posix()][2] = digest
+
+    removed = []
+    for key in sorted(set(previous) - set(manifest)):
+        dst = install_dir / key
+        if dst.is_file() or dst.is_symlink():
+            print(f'    Remove {key}')
+            dst.unlink()
+            removed.append(Path(key))
+    install_dir.mkdir(parents=True, exist_ok=True)
+    write_install_manifest(install_dir, manifest)
+    return {
+        'copied': copies, 'skipped': skipped, 'removed': removed,
+        'precompile_changed': previous_settings != precompile_settings
+    }
+
+def precompile(install_dir: Path, python_command: str, files: list = None, jobs: int = None,
+               optimize: list = None, invalidation_mode: str = 'checked-hash') -> bool:
+    """compile installed modules to bytecode with compileall of python_command
+
+    python_command is the interpreter of the launcher script, so the pyc files
+    carry its cache tag; files (relative to install_dir) restricts compilation
+    to these files, otherwise the top-level and subcommand directories are
+    compiled with jobs worker processes (0: all CPUs)
+    checked-hash pycs are validated by source hash instead of mtime, unchecked-hash
+    pycs are never validated (recompiled by every installation)
+    """
+    if invalidation_mode == 'none':
+        return True
+    cmd = shlex.split(python_command) + ['-m', 'compileall', '-q', '--invalidation-mode', invalidation_mode]
+    for level in optimize or [0]:
+        cmd += ['-o', str(level)]
+    if files is None:
+        cmd += ['-j', str(jobs or 0), '-l', str(install_dir)]
+        cmd += [str(install_dir / d) for d in ('subcommand', 'subcommands') if (install_dir / d).is_dir()]
+    else:
+        files = [str(install_dir / f) for f in files if f.suffix == '.py']
+        if not files:
+            return True
+        cmd += files
+    print('Precompile ({}, optimize {})'.format(invalidation_mode, ','.join(map(str, optimize or [0]))))
+    try:
+        proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    except OSError as e:
+        print(f'    precompilation failed: {e}')
+        return False
+    if proc.returncode != 0:
+        print(f'    precompilation failed:\n{proc.stdout}')
+        return False
+    return True
+
 def package_installation(args):
     ## decide parameters
     python_command = args.pythoncmd
@@ -43,26 +200,67 @@ def package_installation(args):
 
     # installation directory check
     install_dir = Path(args.installdir).resolve()
+
+    # execute script directory
+    execdir = os.path.join(os.path.dirname(install_dir), 'bin')
+    if args.execdir is not None:
+        execdir = args.execdir
+
+    # single-file bundle installation (installdir.pyz)
+    if getattr(args, 'bundle', False):
+        bundle = install_dir.with_name(install_dir.name + BUNDLE_SUFFIX)
+        print(f'Bundle {package_dir.name} to {bundle}')
+        if any(getattr(args, 'optimize', None) or []):
+            print('    --optimize is ignored for --bundle (level 0 pycs only)')
+        bundle.parent.mkdir(parents=True, exist_ok=True)
+        build_bundle(
+            package_dir,
+            bundle,
+            package_files(package_dir),
+            invalidation_mode=getattr(args, 'precompile', None) or 'unchecked-hash'
+        )
+        if not os.path.isdir(execdir):
+            print('create {}'.format(execdir))
+            os.makedirs(execdir)
+        create_bundle_script(os.path.join(execdir, script_name), bundle, python_command)
+        return
+
     print(f'Install {package_dir.name} to {install_dir}')
 
     # package installation
-    files = glob.glob(f'{package_dir}/*.py')
-    files += glob.glob(f'{package_dir}/subcommands/*.py')
-    files += glob.glob(f'{package_dir}/data/*')
-    files += glob.glob(f'{package_dir}/*.yaml')
-    for f in files:
-        bn = Path(f.replace(f'{package_dir}/', ''))
-        src = package_dir / bn
-        dst = install_dir / bn
-        print(f'    Copy {bn}')
-        if not dst.parent.is_dir():
-            os.makedirs(dst.parent)
-        shutil.copyfile(src, dst)
+    sync = getattr(args, 'sync', False)
+    settings = {
+        'python': python_command,
+        'optimize': getattr(args, 'optimize', None) or [0],
+        'invalidation_mode': getattr(args, 'precompile', 'none') or 'checked-hash'
+    }
+    result = sync_files(
+        package_dir,
+        install_dir,
+        package_files(package_dir),
+        sync=sync,
+        jobs=getattr(args, 'jobs', None),
+        precompile_settings=settings
+    )
+    if result['skipped']:
+        print(f'    {len(result["skipped"])} files unchanged')
+
+    # bytecode precompilation (changed files only in sync mode with unchanged settings)
+    compiled = precompile(
+        install_dir,
+        python_command,
+        files=result['copied'] if sync and not result['precompile_changed'] else None,
+        jobs=getattr(args, 'jobs', None),
+        optimize=settings['optimize'],
+        invalidation_mode=settings['invalidation_mode']
+    )
+    if not compiled:
+        ## recompile everything next time
+        manifest = load_install_manifest(install_dir)
+        manifest.pop(INSTALL_MANIFEST_PRECOMPILE, None)
+        write_install_manifest(install_dir, manifest)
 
     # execute script installation
-    execdir = os.path.join(os.path.dirname(install_dir), 'bin')
-    if args.execdir is not None:
-        execdir = args.execdir
     if not os.path.isdir(execdir):
         print('create {}'.format(execdir))
         os.makedirs(execdir)
@@ -101,6 +299,37 @@ def install_argument(script_name, install_dir, python_command, parser_packagedir
         metavar='STR',
         default=python_command
     )
+    parser_install.add_argument(
+        '--sync',
+        help='copy only files changed since the last installation and remove stale files',
+        action='store_true'
+    )
+    parser_install.add_argument(
+        '--jobs', '-j',
+        help='number of parallel copies',
+        metavar='N',
+        type=int,
+        default=None
+    )
+    parser_install.add_argument(
+        '--precompile',
+        help='pyc invalidation mode of bytecode precompilation (default: checked-hash, unchecked-hash for --bundle)',
+        choices=PRECOMPILE_MODES,
+        default=None
+    )
+    parser_install.add_argument(
+        '--optimize', '-O',
+        help='optimization level of precompiled bytecode, repeatable (default: 0, always 0 for --bundle)',
+        action='append',
+        type=int,
+        choices=[0, 1, 2],
+        default=None
+    )
+    parser_install.add_argument(
+        '--bundle',
+        help='install as single-file bundle "installdir.pyz" (zipapp with precompiled bytecode)',
+        action='store_true'
+    )
     parser_install.add_argument(
         '--testscript', '-t',
         help='create test execute script without package installation',
@@ -1,15 +1,334 @@
+import atexit
+import functools
+import io
+import json
 import logging
-import logging.config
-import yaml
+import queue
 import sys
 import os
+import threading
+import time
 from pathlib import Path
-import datetime
+from configfile import load_yaml
 
 LOGGING_CONFIG_FILE = 'logging_config.yaml'
 RESULT_LEVEL = 25
 SCRIPT_NAME = 'application'
 
+class BufferedFileHandler(logging.FileHandler):
+    """append-mode file handler collecting formatted records in memory
+
+    buffer is written when it exceeds buffer_size bytes (0 writes every record),
+    when flush_interval seconds passed since last write, and at close
+    """
+    def __init__(self, filename, buffer_size=0, flush_interval=None, encoding='utf-8'):
+        super().__init__(filename, mode='a', encoding=encoding, delay=True)
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self._buffer = []
+        self._buffered = 0
+        self._last_flush = time.monotonic()
+    def emit(self, record):
+        try:
+            msg = self.format(record) + self.terminator
+            self._buffer.append(msg)
+            self._buffered += len(msg)
+            if self._buffered >= self.buffer_size or (
+                self.flush_interval is not None and time.monotonic() - self._last_flush >= self.flush_interval
+            ):
+                self.flush()
+        except Exception:
+            self.handleError(record)
+    def flush(self):
+        self.acquire()
+        try:
+            if self._buffer:
+                if self.stream is None:
+                    self.stream = self._open()
+                self.stream.write(''.join(self._buffer))
+                self._buffer.clear()
+                self._buffered = 0
+            super().flush()
+            self._last_flush = time.monotonic()
+        finally:
+            self.release()
+    def close(self):
+        self.acquire()
+        try:
+            self.flush()
+        finally:
+            self.release()
+        super().close()
+    def write_text(self, text):
+        """append preformatted text (bulk write bypassing records)"""
+        self.acquire()
+        try:
+            self._buffer.append(text)
+            self._buffered += len(text)
+            if self._buffered >= self.buffer_size:
+                self.flush()
+        finally:
+            self.release()
+
+## pool of result file handlers shared by all ResultLogger instances
+_result_handlers = {}
+_result_handlers_lock = threading.Lock()
+_result_buffering = {'buffer_size': 0, 'flush_interval': None}
+_result_flusher = None
+
+def set_result_buffering(buffer_size=0, flush_interval=None):
+    """set write buffering of result logfiles (also applied to open logfiles)
+
+    - buffer_size: bytes kept in memory before writing (0: write every result)
+    - flush_interval: seconds after which buffered results are written
+    """
+    global _result_flusher
+    with _result_handlers_lock:
+        _result_buffering.update(buffer_size=buffer_size, flush_interval=flush_interval)
+        for handler in _result_handlers.values():
+            handler.buffer_size = buffer_size
+            handler.flush_interval = flush_interval
+        if flush_interval is not None and _result_flusher is None:
+            _result_flusher = threading.Thread(target=_flush_result_handlers_periodically, name='result-flusher', daemon=True)
+            _result_flusher.start()
+
+def _flush_result_handlers_periodically():
+    """write buffered results at flush interval even if no further result arrives"""
+    while True:
+        interval = _result_buffering['flush_interval']
+        time.sleep(interval if interval else 1.0)
+        if interval:
+            flush_result_handlers()
+
+def result_handler(logfile) -> BufferedFileHandler:
+    """return pooled handler of logfile, opened once per process"""
+    key = os.path.abspath(logfile)
+    handler = _result_handlers.get(key)
+    if handler is None:
+        with _result_handlers_lock:
+            handler = _result_handlers.get(key)
+            if handler is None:
+                handler = BufferedFileHandler(key, **_result_buffering)
+                handler.setFormatter(logging.Formatter('%(message)s'))
+                _result_handlers[key] = handler
+    return handler
+
+def flush_result_handlers():
+    """write buffered results of all logfiles"""
+    with _result_handlers_lock:
+        handlers = list(_result_handlers.values())
+    for handler in handlers:
+        handler.flush()
+
+def close_result_handlers():
+    """flush and close all result logfiles"""
+    with _result_handlers_lock:
+        handlers = list(_result_handlers.values())
+        _result_handlers.clear()
+    for handler in handlers:
+        handler.close()
+
+atexit.register(close_result_handlers)
+
+## bulk result output
+RESULT_FORMATS = ('text', 'table', 'csv', 'jsonl')
+
+class ResultWriter:
+    """streaming writer formatting result rows in bulk
+
+    rows are formatted into chunks of about chunk_size characters which are written
+    straight to the stdout stream and/or the pooled logfile handler; when logger
+    no longer has stream_handler as its only handler (logging configured, queue
+    logging), stdout rows are emitted through logger one record per line instead
+        - text: same format as ResultLogger.result
+        - table: columns aligned over all rows (written at close)
+        - csv: rows as CSV records, dict rows by columns (header written if columns known)
+        - jsonl: one JSON document per row
+    when stdout is closed by the reader (e.g. piped to head), stdout output stops silently
+    """
+    def __init__(
+        self, stream_handler=None, *,
+        logger=None,
+        logfile=None,
+        output_stdout=True,
+        format='text',
+        prefix=None,
+        prefix_delimiter=' ',
+        output_delimiter=' ',
+        indent=0,
+        columns=None,
+        header=None,
+        chunk_size=1 << 16
+        ):
+        if format not in RESULT_FORMATS:
+            raise ValueError(f'invalid result format: {format}')
+        self.stream_handler = stream_handler if output_stdout else None
+        self.logger = logger
+        self.file_handler = result_handler(logfile) if logfile else None
+        self.format = format
+        self.prefix = prefix
+        self.prefix_delimiter = prefix_delimiter
+        self.output_delimiter = output_delimiter
+        self.indent = indent
+        self.columns = list(columns) if columns is not None else None
+        self.header = header
+        self.chunk_size = chunk_size
+        self.count = 0
+        self.broken_pipe = False
+        self._chunk = []
+        self._size = 0
+        self._rows = [] # table rows kept until close
+        self._csv_buffer = None
+        self._csv_writer = None
+
+    @property
+    def active(self) -> bool:
+        """False if there is no output left (stdout closed and no logfile)"""
+        return self.stream_handler is not None or self.file_handler is not None
+
+    def _format_text(self, row) -> str:
+        if isinstance(row, (list, tuple)):
+            row = self.output_delimiter.join(str(s) for s in row)
+        elif isinstance(row, dict):
+            row = self.output_delimiter.join(str(s) for s in row.values())
+        if self.prefix is not None:
+            row = f'{self.prefix}{self.prefix_delimiter}{row}'
+        if self.indent > 0:
+            row = f"{' ' * self.indent}{row}"
+        return f'{row}\n'
+
+    def _format_csv(self, row) -> str:
+        if self._csv_writer is None:
+            import csv
+            self._csv_buffer = io.StringIO()
+            if self.columns is None and isinstance(row, dict):
+                self.columns = list(row)
+            if self.columns is not None:
+                self._csv_writer = csv.DictWriter(self._csv_buffer, self.columns, extrasaction='ignore', lineterminator='\n')
+                if self.header is not False:
+                    self._csv_writer.writeheader()
+            else:
+                self._csv_writer = csv.writer(self._csv_buffer, lineterminator='\n')
+        if isinstance(row, dict) or self.columns is None:
+            if isinstance(row, str):
+                row = [row]
+            self._csv_writer.writerow(row)
+        else:
+            self._csv_writer.writerow(dict(zip(self.columns, row)))
+        text = self._csv_buffer.getvalue()
+        self._csv_buffer.seek(0)
+        self._csv_buffer.truncate()
+        return text
+
+    def _format_jsonl(self, row) -> str:
+        if self.columns is not None and isinstance(row, (list, tuple)):
+            row = dict(zip(self.columns, row))
+        return json.dumps(row, default=str, ensure_ascii=False) + '\n'
+
+    def write(self, row) -> None:
+        """format and queue one row"""
+        if self.format == 'table':
+            self._rows.append(list(row.values()) if isinstance(row, dict) else [row] if isinstance(row, str) else list(row))
+            if self.columns is None and isinstance(row, dict):
+                self.columns = list(row)
+        elif self.format == 'csv':
+            self._append(self._format_csv(row))
+        elif self.format == 'jsonl':
+            self._append(self._format_jsonl(row))
+        else:
+            self._append(self._format_text(row))
+        self.count += 1
+
+    def write_many(self, rows) -> int:
+        """format and queue rows, stop when no output is left, return number of rows"""
+        count = self.count
+        for row in rows:
+            if not self.active:
+                break
+            self.write(row)
+        return self.count - count
+
+    def _append(self, text: str) -> None:
+        self._chunk.append(text)
+        self._size += len(text)
+        if self._size >= self.chunk_size:
+            self.flush()
+
+    def _table_text(self) -> str:
+        rows = [[str(c) for c in row] for row in self._rows]
+        if self.columns is not None and self.header is not False:
+            rows.insert(0, [str(c) for c in self.columns])
+        if not rows:
+            return ''
+        ncols = max(len(row) for row in rows)
+        widths = [max((len(row[i]) for row in rows if i < len(row)), default=0) for i in range(ncols)]
+        numeric = [
+            all(isinstance(row[i], (int, float)) for row in self._rows if i < len(row)) and bool(self._rows)
+            for i in range(ncols)
+        ]
+        delimiter = self.output_delimiter if self.output_delimiter != ' ' else '  '
+        lines = []
+        for row in rows:
+            cells = [c.rjust(widths[i]) if numeric[i] else c.ljust(widths[i]) for i, c in enumerate(row)]
+            line = delimiter.join(cells).rstrip()
+            if self.prefix is not None:
+                line = f'{self.prefix}{self.prefix_delimiter}{line}'
+            lines.append(f"{' ' * self.indent}{line}\n")
+        return ''.join(lines)
+
+    def flush(self) -> None:
+        """write queued chunk"""
+        if not self._chunk:
+            return
+        text = ''.join(self._chunk)
+        self._chunk.clear()
+        self._size = 0
+        if self.stream_handler is not None:
+            ## handlers are looked up on every write, logging may be configured meanwhile
+            if self.logger is None or self.logger.handlers == [self.stream_handler]:
+                self._write_stdout(text)
+            else:
+                for line in text.splitlines():
+                    self.logger.log(RESULT_LEVEL, line)
+        if self.file_handler is not None:
+            self.file_handler.write_text(text)
+
+    def _write_stdout(self, text: str) -> None:
+        handler = self.stream_handler
+        handler.acquire()
+        try:
+            handler.stream.write(text)
+            handler.stream.flush()
+        except BrokenPipeError:
+            ## reader went away: point stdout to devnull so that later flushes
+            ## (including the one at interpreter exit) do not fail again
+            self.broken_pipe = True
+            self.stream_handler = None
+            try:
+                devnull = os.open(os.devnull, os.O_WRONLY)
+                os.dup2(devnull, handler.stream.fileno())
+                os.close(devnull)
+            except (OSError, AttributeError, ValueError):
+                pass
+        finally:
+            handler.release()
+
+    def close(self) -> None:
+        """write remaining rows (and the table)"""
+        if self.format == 'table':
+            self._append(self._table_text())
+            self._rows.clear()
+        self.flush()
+        if self.file_handler is not None:
+            self.file_handler.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
 class ResultLogger(logging.Logger):
     default_prefix = None
     def __init__(self, name):
@@ -18,6 +337,18 @@ class ResultLogger(logging.Logger):
         handler = logging.StreamHandler(sys.stdout)
         handler.setFormatter(logging.Formatter('%(message)s'))
         self.addHandler(handler)
+        self.result_stream_handler = handler
+    def result_writer(self, *, prefix=None, **kwargs) -> ResultWriter:
+        """return streaming ResultWriter writing to stdout and/or logfile (see ResultWriter)"""
+        if prefix is None and self.default_prefix is not None:
+            prefix = self.default_prefix
+        if not self.isEnabledFor(RESULT_LEVEL):
+            kwargs.update(output_stdout=False, logfile=None)
+        return ResultWriter(self.result_stream_handler, logger=self, prefix=prefix, **kwargs)
+    def result_many(self, rows, **kwargs) -> int:
+        """write iterable of rows in bulk, return number of rows written"""
+        with self.result_writer(**kwargs) as writer:
+            return writer.write_many(rows)
     def result(
         self, message, *,
         logfile=None,
@@ -44,32 +375,152 @@ class ResultLogger(logging.Logger):
         if output_stdout:
             super().log(RESULT_LEVEL, message)
 
-        ## output to logfile
-        if logfile:
-            fh = logging.FileHandler(logfile, mode='a', encoding='utf-8')
-            fh.setFormatter(logging.Formatter('%(message)s'))
-            self.addHandler(fh)
-            self.log(RESULT_LEVEL, message, **kwargs)
-            self.removeHandler(fh)
+        ## output to logfile through pooled handler
+        if logfile and self.isEnabledFor(RESULT_LEVEL):
+            record = self.makeRecord(
+                self.name, RESULT_LEVEL, '(result)', 0, message, None, None, extra=kwargs.get('extra')
+            )
+            result_handler(logfile).handle(record)
 
 ## define level
 logging.addLevelName(RESULT_LEVEL, 'RESULT')
 logging.setLoggerClass(ResultLogger)
 
-def setup_logging(config_file=LOGGING_CONFIG_FILE, logfile=None):
-    with open(config_file, 'r', encoding='utf-8') as f:
-        logging_config = yaml.safe_load(f)
+## queue logging mode
+QUEUE_OVERFLOW_POLICIES = ('block', 'drop', 'drop_oldest')
+_queue_listener = None
+_queue_handlers = []
+
+@functools.cache
+def _queue_classes():
+    """define queue mode classes (logging.handlers imports socket, pickle, ... on first use)"""
+    import logging.handlers
+
+    class RoutingQueueHandler(logging.handlers.QueueHandler):
+        """queue handler enqueuing records together with the handlers of its logger
+
+        overflow policy of bounded queue:
+            - block: wait for free space
+            - drop: discard new record
+            - drop_oldest: discard oldest queued record
+        """
+        def __init__(self, queue, targets, overflow='block'):
+            super().__init__(queue)
+            if overflow not in QUEUE_OVERFLOW_POLICIES:
+                raise ValueError(f'invalid overflow policy: {overflow}')
+            self.targets = targets
+            self.overflow = overflow
+            self.dropped = 0
+        def enqueue(self, record):
+            item = (self.targets, record)
+            if self.overflow == 'block':
+                self.queue.put(item)
+                return
+            try:
+                self.queue.put_nowait(item)
+                return
+            except queue.Full:
+                pass
+            if self.overflow == 'drop_oldest':
+                try:
+                    self.queue.get_nowait()
+                    self.queue.put_nowait(item)
+                except (queue.Empty, queue.Full):
+                    pass
+            self.dropped += 1
+
+    class RoutingQueueListener(logging.handlers.QueueListener):
+        """queue listener passing each record to the handlers it was enqueued with"""
+        def enqueue_sentinel(self):
+            ## wait for free space in a full bounded queue
+            self.queue.put(self._sentinel)
+        def handle(self, item):
+            targets, record = item
+            for handler in targets:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+
+    return RoutingQueueHandler, RoutingQueueListener
+
+def __getattr__(name):
+    if name == 'RoutingQueueHandler':
+        return _queue_classes()[0]
+    if name == 'RoutingQueueListener':
+        return _queue_classes()[1]
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+def start_queue_logging(logger_names, queue_size=10000, overflow='block'):
+    """move handlers of loggers (None for root) behind one queue and listener thread"""
+    global _queue_listener
+    stop_queue_logging()
+    RoutingQueueHandler, RoutingQueueListener = _queue_classes()
+    log_queue = queue.Queue(queue_size)
+    handlers = []
+    for name in logger_names:
+        logger = logging.getLogger(name)
+        targets = list(logger.handlers)
+        if not targets:
+            continue
+        for handler in targets:
+            logger.removeHandler(handler)
+            if handler not in handlers:
+                handlers.append(handler)
+        queue_handler = RoutingQueueHandler(log_queue, targets, overflow)
+        logger.addHandler(queue_handler)
+        _queue_handlers.append((logger, queue_handler))
+    _queue_listener = RoutingQueueListener(log_queue, *handlers)
+    _queue_listener.start()
+    return _queue_listener
+
+def stop_queue_logging():
+    """write queued records and restore original handlers"""
+    global _queue_listener
+    if _queue_listener is None:
+        return
+    listener, _queue_listener = _queue_listener, None
+    listener.stop()
+    for logger, queue_handler in _queue_handlers:
+        logger.removeHandler(queue_handler)
+        for handler in queue_handler.targets:
+            logger.addHandler(handler)
+    _queue_handlers.clear()
+
+atexit.register(stop_queue_logging)
+
+def setup_logging(config_file=LOGGING_CONFIG_FILE, logfile=None, use_queue=None, queue_size=None, overflow=None):
+    """configure logging from YAML file
+
+    with use_queue (or "queue: {enabled: true}" in YAML), handlers of the configured
+    loggers are served by a listener thread through a bounded queue of queue_size
+    records with overflow policy block, drop or drop_oldest
+    """
+    logging_config = load_yaml(config_file)
     if logfile:
         if 'handlers' in logging_config and 'fileHandler' in logging_config['handlers']:
             handler = logging_config['handlers']['fileHandler']
             if handler.get('filename') == '__LOGFILE__':
                 handler['filename'] = logfile
+    queue_config = logging_config.pop('queue', None) or {}
+    if use_queue is None:
+        use_queue = queue_config.get('enabled', False)
+    stop_queue_logging()
+    import logging.config
     logging.config.dictConfig(logging_config)
+    if use_queue:
+        logger_names = list(logging_config.get('loggers', {}))
+        if 'root' in logging_config:
+            logger_names.append(None)
+        start_queue_logging(
+            logger_names,
+            queue_size=queue_config.get('size', 10000) if queue_size is None else queue_size,
+            overflow=queue_config.get('overflow', 'block') if overflow is None else overflow
+        )
 
 def get_logger(name=None):
     return logging.getLogger(name)
 
 def default_logfile_name(script_name=SCRIPT_NAME):
+    import datetime
     now = datetime.datetime.now().strftime('%y%m%d%H%M')
     logfile_name = f'{script_name}-{now}-{os.getpid()}.log'
     return Path.cwd() / Path(logfile_name)
@@ -1,14 +1,25 @@
 ## load standard libraries
-import yaml
+import os
+import sys
+import time
+import traceback
 import importlib
+from functools import partial
 from dataclasses import make_dataclass, field
 from pathlib import Path
 
 ## load subcommands_framework libraries
-from config import config
-from args import config_arguments, positional_arguments, build_root_parser, error_nosubcommand
-from logger import get_logger
-from package_config import ConfigCommon, common_arguments, preproc_config, postproc_config
+from config import config, GlobalConfig, LayeredConfig
+from args import config_arguments, profile_arguments, mode_arguments, root_argv, build_root_parser, error_nosubcommand
+from args import add_placeholder_parser, remove_subparsers
+from bundle import bundle_archive
+from args import SpecError, dump_parser_spec, build_parser_from_spec, build_subparser_from_spec, parser_spec_subcommands
+from cache import cache_dir, cache_key, file_fingerprint, load_cache, store_cache
+from configfile import PACKAGE_CONFIG_FILE, load_yaml
+from logger import get_logger, flush_result_handlers, close_result_handlers
+from manifest import MANIFEST_FILE, module_path, load_manifest, write_manifest, collect_entries, detect_subcommand
+from profiler import phase, enable_from_argv, finish as finish_profiler
+from package_config import ConfigCommon, common_arguments, positional_arguments, preproc_config, postproc_config
 
 ## append common config
 config.append_config(ConfigCommon)
@@ -16,6 +27,12 @@ config.append_config(ConfigCommon)
 ## declare a safe default logger for module-level functions; main() will reinitialize
 logger = get_logger(__name__)
 
+## parser cache file name in cache directory
+PARSER_CACHE_FILE = 'parser.pickle'
+
+## user config file found by load_user_config_file
+user_config_file = None
+
 ## default user config files location
 USER_CONFIG_FILES = [
     f'.{config.prog}',
@@ -23,33 +40,40 @@ USER_CONFIG_FILES = [
     f'~/.config/{config.prog}.yaml'
 ]
 
-def search_configfile(config_files: list) -> Path | None:
-    """search config file location"""
+def find_configfile(config_files: list) -> Path | None:
+    """return first existing config file"""
     for p in map(Path, config_files):
         p = p.expanduser().absolute()
         if p.is_file():
-            logger.info(f'detect {p}')
             return p
     return None
 
+def search_configfile(config_files: list) -> Path | None:
+    """search config file location"""
+    p = find_configfile(config_files)
+    if p is not None:
+        logger.info(f'detect {p}')
+    return p
+
 def load_config_file(config_file: Path) -> dict:
     """load YAML format config file"""
     defaults = {}
     if isinstance(config_file, Path) and config_file.is_file():
         logger.info(f'load config file ({config_file})')
-        with config_file.open('r', encoding='utf-8') as f:
-            data = yaml.safe_load(f) or {}
-            if not isinstance(data, dict):
-                raise ValueError('top-level YAML must be a mapping/dict')
-            defaults.update(data)
+        data = load_yaml(config_file) or {}
+        if not isinstance(data, dict):
+            raise ValueError('top-level YAML must be a mapping/dict')
+        defaults.update(data)
     return defaults
 
-def load_user_config_file(parser_config, user_config_files):
+def load_user_config_file(parser_config, user_config_files, argv=None):
     """determine config file path and load available config file"""
-    args_config,_ = parser_config.parse_known_args()
+    args_config,_ = parser_config.parse_known_args(argv)
     if args_config.config:
         user_config_files = [args_config.config] + user_config_files
     config_file = search_configfile(user_config_files)
+    global user_config_file
+    user_config_file = config_file
     if config_file is not None:
         user_config_defaults = load_config_file(config_file)
         if 'common' in user_config_defaults:
@@ -58,29 +82,159 @@ def load_user_config_file(parser_config, user_config_files):
                 fields_spec.append((k, type(v), field(default=v)))
             ConfigUserCommon = make_dataclass('ConfigUserCommon', fields_spec)
             config.append_config(ConfigUserCommon)
+        config.params = LayeredConfig.of(config.params).with_layer('user', user_config_defaults)
         if config.debug:
             logger.debug('Default configs:')
             for k,v in config.items():
                 logger.debug(f'  {k} = {v}')
-            config.params = {**config.params, **user_config_defaults}
     return config.params
 
-def load_subcommands(subparsers, parent_parsers):
-    """load subcommand modules and register available config and arguments"""
-    if 'package' in config.params:
-        for module_name in config.params['package']['subcommand_modules']:
+def import_subcommand(module_name):
+    """import subcommand module from subcommands directory"""
+    if config.subcommands_dir.name == '': # subcommands_dir = Path('.')
+        return importlib.import_module(module_name)
+    return importlib.import_module(f'{config.subcommands_dir.name}.{module_name}')
+
+def manifest_location() -> Path | None:
+    """return subcommand manifest file
+
+    the manifest of a bundle (read-only and without module mtimes) is kept in the
+    cache directory and keyed on the bundle's size and mtime
+    """
+    archive = bundle_archive(config.package_dir)
+    if archive is None:
+        return config.package_dir / MANIFEST_FILE
+    base = cache_dir(config.prog)
+    if base is None:
+        return None
+    st = archive.stat()
+    return base / f'manifest-{cache_key(str(archive), st.st_size, st.st_mtime_ns)[:16]}.json'
+
+def register_subcommand_module(subparsers, parent_parsers, module_name, entries):
+    """replace placeholders of module_name by the subcommands it registers"""
+    remove_subparsers(subparsers, [n for e in entries if e['module'] == module_name for n in [e['name'], *e['aliases']]])
+    if config.debug:
+        logger.debug(f'load {module_name}')
+    with phase(f'import:{module_name}'):
+        module = import_subcommand(module_name)
+    with phase(f'register:{module_name}'):
+        module.register_subcommand(subparsers, parent_parsers)
+
+def load_subcommands(subparsers, parent_parsers, argv=None, lazy=None):
+    """load subcommand modules and register available config and arguments
+
+    when a valid subcommand manifest exists, only the module of the subcommand
+    given in argv is imported and the others are registered as lightweight
+    placeholders which are enough for the root help (a placeholder selected by
+    the parser imports its module on dispatch)
+    return manifest entries of all subcommands
+    """
+    if 'package' not in config.params:
+        return []
+    if lazy is None:
+        lazy = config.lazy_subcommands
+    module_names = config.params['package']['subcommand_modules']
+    subcommands_dir = config.package_dir / config.subcommands_dir
+    manifest_file = manifest_location()
+    entries = None
+    if lazy and manifest_file is not None:
+        entries = load_manifest(manifest_file, subcommands_dir, module_names)
+
+    ## no manifest: import all modules and record manifest for next invocation
+    if entries is None:
+        entries = []
+        for module_name in module_names:
             if config.debug:
                 logger.debug(f'load {module_name}')
                 logger.debug(config.print_config())
-            if config.subcommands_dir.name == '': # subcommands_dir = Path('.')
-                module = importlib.import_module(module_name)
-            else:
-                module = importlib.import_module(f'{config.subcommands_dir.name}.{module_name}')
-            module.register_subcommand(subparsers, parent_parsers)
+            known = set(subparsers.choices)
+            with phase(f'import:{module_name}'):
+                module = import_subcommand(module_name)
+            with phase(f'register:{module_name}'):
+                module.register_subcommand(subparsers, parent_parsers)
+            entries += collect_entries(subparsers, module_name, known)
+        if config.lazy_subcommands and manifest_file is not None:
+            if not write_manifest(manifest_file, subcommands_dir, module_names, entries):
+                logger.debug(f'cannot write {manifest_file}')
+        return entries
+
+    ## manifest: import selected subcommand only
+    if argv is None:
+        argv = sys.argv[1:]
+    names = {n for e in entries for n in [e['name'], *e['aliases']]}
+    command = detect_subcommand(argv, names, parent_parsers)
+    selected = next((e['module'] for e in entries if command in [e['name'], *e['aliases']]), None)
+    for entry in entries:
+        if entry['module'] == selected:
+            register_subcommand_module(subparsers, parent_parsers, selected, entries)
+            selected = None
+        elif entry['name'] not in subparsers.choices:
+            add_placeholder_parser(
+                subparsers, entry['name'], entry['aliases'], entry['help'],
+                partial(register_subcommand_module, subparsers, parent_parsers, entry['module'], entries)
+            )
+    return entries
+
+def parser_cache_key() -> str:
+    """return parser cache key from package config, user config and module files"""
+    module_names = config.params.get('package', {}).get('subcommand_modules', [])
+    subcommands_dir = config.package_dir / config.subcommands_dir
+    files = [config.package_dir / PACKAGE_CONFIG_FILE, user_config_file]
+    files += [Path(sys.modules[name].__file__) for name in ('args', 'package_config', __name__)]
+    files += [module_path(subcommands_dir, m) for m in module_names]
+    files.append(bundle_archive(config.package_dir)) # files inside a bundle have no own fingerprint
+    return cache_key(sys.version_info[:2], module_names, [file_fingerprint(f) for f in files])
+
+def load_cached_parser(cache_file, key, argv=None):
+    """rebuild parser from cached spec, None if no valid cache
+
+    only the module of the subcommand given in argv is imported (without
+    running its register_subcommand) and its parser is built completely
+    """
+    cached = load_cache(cache_file)
+    if not isinstance(cached, dict) or cached.get('key') != key:
+        return None
+    spec = cached['spec']
+    if argv is None:
+        argv = sys.argv[1:]
+    entries = parser_spec_subcommands(spec)
+    names = {n for e in entries for n in [e['name'], *e['aliases']]}
+    def load(command):
+        module_name = next(e['module'] for e in entries if command in [e['name'], *e['aliases']])
+        if module_name is not None:
+            with phase(f'import:{module_name}'):
+                import_subcommand(module_name)
+    ## placeholders not detected in argv import their module when selected by the parser
+    parser, subparsers = build_parser_from_spec(spec, load)
+    command = detect_subcommand(argv, names, [parser])
+    if command is not None:
+        load(command)
+        build_subparser_from_spec(subparsers, spec, command)
+    return parser
+
+def store_cached_parser(cache_file, key, parser, entries) -> bool:
+    """store spec of fully built parser to cache file"""
+    try:
+        spec = dump_parser_spec(parser, {n: e['module'] for e in entries for n in [e['name'], *e['aliases']]})
+    except SpecError as e:
+        logger.debug(f'parser cannot be cached: {e}')
+        return False
+    return store_cache(cache_file, {'key': key, 'spec': spec})
+
+def build_parser(argv=None, lazy=None, use_cache=None):
+    """initialize config and return argument parser for argv
+
+    lazy=False imports and registers every subcommand module, use_cache=False
+    ignores the parser cache (both are needed by a parser serving any argv)
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+    if use_cache is None:
+        use_cache = config.parser_cache
 
-def main():
     ## pre-processing
-    preproc_config()
+    with phase('preproc_config'):
+        preproc_config()
 
     # reinitialize logger with program name after config is ready
     global logger
@@ -88,27 +242,64 @@ def main():
 
     ## define config file argument and load user config file
     parser_config = config_arguments(USER_CONFIG_FILES)
-    load_user_config_file(parser_config, USER_CONFIG_FILES)
+    with phase('load_user_config_file'):
+        load_user_config_file(parser_config, USER_CONFIG_FILES, argv)
 
-    ## define package common arguments
-    parser_common = common_arguments()
+    ## define profiling arguments (options are scanned from argv by profiler)
+    parser_profile = profile_arguments()
 
-    ## define positional argument for subcommands
-    parser_positional = positional_arguments()
+    ## define run mode arguments (options are read by main before parsing)
+    parser_mode = mode_arguments()
 
-    ## build root parser
-    parser, subparsers = build_root_parser(
-        config.prog,
-        config.description,
-        [parser_config, parser_common]
-    )
+    ## rebuild parser from parser cache
+    parser = None
+    if use_cache:
+        with phase('load_cached_parser'):
+            cache_file = cache_dir(config.prog)
+            if cache_file is not None:
+                cache_file = cache_file / PARSER_CACHE_FILE
+            key = parser_cache_key()
+            parser = load_cached_parser(cache_file, key, argv)
 
-    ## load subcommands
-    load_subcommands(
-        subparsers,
-        [parser_config, parser_common, parser_positional]
-    )
-    args = parser.parse_args()
+    if parser is None:
+        with phase('build_parser'):
+            ## define package common arguments
+            parser_common = common_arguments()
+
+            ## define positional argument for subcommands
+            parser_positional = positional_arguments()
+
+            ## build root parser
+            parser, subparsers = build_root_parser(
+                config.prog,
+                config.description,
+                [parser_config, parser_common, parser_profile, parser_mode]
+            )
+
+        ## load subcommands (all of them when the parser is going to be cached)
+        with phase('load_subcommands'):
+            entries = load_subcommands(
+                subparsers,
+                [parser_config, parser_common, parser_profile, parser_positional],
+                argv=argv,
+                lazy=False if use_cache else lazy
+            )
+        if use_cache:
+            with phase('store_cached_parser'):
+                if not store_cached_parser(cache_file, key, parser, entries):
+                    logger.debug('parser cache is not stored')
+    return parser
+
+def dispatch(parser, argv=None):
+    """parse argv and call handler of the subcommand"""
+    with phase('parse_args'):
+        args, extras = parser.parse_known_args(argv)
+        load = getattr(args, 'load_subcommand', None)
+        if load is not None: # placeholder of a subcommand not detected in argv
+            load()
+            args = parser.parse_args(argv)
+        elif extras:
+            args = parser.parse_args(argv) # reports unrecognized arguments
 
     ## help printout if no subcommand is specified
     if args.command is None:
@@ -116,5 +307,205 @@ def main():
         parser.exit(2)
     ## otherwise call function related to subcommand
     else:
-        postproc_config(args) # post-processing
-        args.handler(args)
+        with phase('postproc_config'):
+            postproc_config(args) # post-processing
+        with phase('handler'):
+            args.handler(args)
+
+def exit_status(code) -> int:
+    """return process exit status of SystemExit code"""
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print(code, file=sys.stderr)
+    return 1
+
+def run_command(parser, argv) -> int:
+    """dispatch argv and return its exit status instead of exiting"""
+    try:
+        dispatch(parser, argv)
+    except SystemExit as e:
+        return exit_status(e.code)
+    except KeyboardInterrupt:
+        return 130
+    except Exception:
+        traceback.print_exc()
+        return 1
+    return 0
+
+def package_state() -> tuple:
+    """return (path, size, mtime) of package config, user config and loaded package modules"""
+    package_dir = os.path.join(str(config.package_dir), '')
+    files = [config.package_dir / PACKAGE_CONFIG_FILE, user_config_file]
+    files += sorted(
+        m.__file__ for m in list(sys.modules.values())
+        if (getattr(m, '__file__', None) or '').startswith(package_dir)
+    )
+    state = []
+    for f in files:
+        try:
+            st = os.stat(f)
+            state.append((str(f), st.st_size, st.st_mtime_ns))
+        except (OSError, TypeError):
+            state.append((str(f), None, None))
+    return tuple(state)
+
+def server_check(argv) -> str | None:
+    """return reason why argv cannot be run by the server (in the client's cwd/env), None if it can"""
+    args_config,_ = config_arguments(USER_CONFIG_FILES).parse_known_args(argv)
+    found = find_configfile(([args_config.config] if args_config.config else []) + USER_CONFIG_FILES)
+    if found != user_config_file:
+        return f'user config file {found} differs from server ({user_config_file})'
+    return None
+
+def serve_forever(socket_path, argv=None):
+    """run server of fully built parser on socket_path"""
+    from server import serve
+    parser = build_parser(argv, lazy=False, use_cache=False)
+    state = package_state()
+    def run(argv):
+        enable_from_argv(argv)
+        try:
+            return run_command(parser, argv)
+        finally:
+            ## exit work of a local run (atexit handlers belong to the server process)
+            close_result_handlers()
+            finish_profiler()
+    serve(
+        socket_path,
+        run,
+        check=server_check,
+        stale=lambda: package_state() != state
+    )
+
+def read_batch(batch_file) -> list:
+    """return [(line number, argv)] of batch file ('-': stdin)
+
+    a line is a JSON array of arguments or a shell-like command line,
+    empty lines and lines starting with # are skipped
+    """
+    import json
+    import shlex
+    if str(batch_file) == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        lines = Path(batch_file).read_text(encoding='utf-8').splitlines()
+    batch = []
+    for n, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        try:
+            argv = json.loads(line) if line.startswith('[') else shlex.split(line)
+        except ValueError as e:
+            raise ValueError(f'{batch_file}:{n}: {e}') from None
+        if not isinstance(argv, list) or not all(isinstance(a, str) for a in argv):
+            raise ValueError(f'{batch_file}:{n}: JSON line must be an array of strings')
+        batch.append((n, argv))
+    return batch
+
+## parser and config snapshot of batch runs (inherited by forked workers)
+_batch_state = None
+
+def run_batch_line(argv) -> tuple:
+    """run one batch line on a config restored from the base snapshot, return (status, seconds)"""
+    parser, base = _batch_state
+    t0 = time.perf_counter()
+    reason = server_check(argv)
+    if reason is not None:
+        print(f'{config.prog}: {reason}', file=sys.stderr)
+        status = 2
+    else:
+        GlobalConfig.restore(base)
+        status = run_command(parser, argv)
+    flush_result_handlers()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    return status, time.perf_counter() - t0
+
+def run_batch(batch_file, argv=None, jobs: int = 1, report=None) -> int:
+    """run command lines of batch_file with one parser, return exit status (1 if any line failed)
+
+    - argv: root options given with --batch, added to every line (batch_line_argv)
+    - jobs: worker processes (forked, they share the built parser); output of
+      concurrent lines may interleave
+    - report: file receiving one JSON line per command line (line, argv, status, time)
+    an unreadable or invalid batch file or an unwritable report is reported with
+    exit status 2 before any line runs
+    """
+    import json
+    argv = [] if argv is None else list(argv)
+    try:
+        batch = read_batch(batch_file)
+        out = None if report is None else sys.stderr if report == '-' else open(report, 'w', encoding='utf-8')
+    except (OSError, ValueError) as e:
+        print(f'{config.prog}: error: {e}', file=sys.stderr)
+        return 2
+    try:
+        results = _run_batch_lines(argv, [a for _, a in batch], jobs)
+        if out is not None:
+            for (n, a), (status, elapsed) in zip(batch, results):
+                out.write(json.dumps({'line': n, 'argv': a, 'status': status, 'time': round(elapsed, 6)}) + '\n')
+    finally:
+        if out is not None and out is not sys.stderr:
+            out.close()
+    return 1 if any(status for status, _ in results) else 0
+
+def batch_line_argv(parser, options, argv) -> list:
+    """return argv of a batch line with root options inserted after its subcommand
+
+    after the subcommand, the options are parsed by the subcommand parser whose
+    defaults would otherwise replace them (e.g. --verbose); options of the line
+    itself still come later and win
+    """
+    if not options:
+        return argv
+    k = len(root_argv(argv, [parser]))
+    if k < len(argv) and argv[k] != '--':
+        return [*argv[:k + 1], *options, *argv[k + 1:]]
+    return [*options, *argv]
+
+def _run_batch_lines(options, argvs, jobs) -> list:
+    """build parser for root options and return [(status, seconds)] of argvs"""
+    global _batch_state
+    parser = build_parser(options, lazy=False, use_cache=False)
+    _batch_state = (parser, GlobalConfig.snapshot())
+    argvs = [batch_line_argv(parser, options, a) for a in argvs]
+    if jobs > 1 and len(argvs) > 1:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        sys.stdout.flush()
+        sys.stderr.flush()
+        with ProcessPoolExecutor(min(jobs, len(argvs)), mp_context=multiprocessing.get_context('fork')) as pool:
+            results = list(pool.map(run_batch_line, argvs, chunksize=max(1, len(argvs) // (jobs * 4))))
+    else:
+        results = [run_batch_line(a) for a in argvs]
+    GlobalConfig.restore(_batch_state[1])
+    _batch_state = None
+    return results
+
+def run_mode(argv) -> tuple:
+    """return (run mode options, other root options, rest of argv) of argv"""
+    parser_mode = mode_arguments()
+    parser_mode.prog = config.prog
+    root = root_argv(argv, [config_arguments(USER_CONFIG_FILES), common_arguments(), profile_arguments(), parser_mode])
+    mode, options = parser_mode.parse_known_args(root)
+    return mode, options, argv[len(root):]
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    mode, options, rest = run_mode(argv)
+    argv = options + rest
+    ## server mode
+    if mode.serve is not None:
+        serve_forever(mode.serve, argv)
+        return
+    ## batch mode (root options apply to every line, subcommands come from the batch file)
+    if mode.batch is not None:
+        if rest:
+            print(f'{config.prog}: error: --batch takes command lines from FILE, not from argv: {" ".join(rest)}', file=sys.stderr)
+            sys.exit(2)
+        sys.exit(run_batch(mode.batch, options, mode.batch_jobs, mode.batch_report))
+    dispatch(build_parser(argv), argv)
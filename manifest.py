@@ -0,0 +1,92 @@
+## subcommand manifest
+"""precomputed subcommand manifest for lazy subcommand loading"""
+import json
+import os
+from pathlib import Path
+
+from args import option_takes_value
+
+MANIFEST_FILE = 'subcommand_manifest.json'
+MANIFEST_VERSION = 1
+
+def module_path(subcommands_dir: Path, module_name: str) -> Path:
+    """return source file path of subcommand module"""
+    return Path(subcommands_dir) / f'{module_name}.py'
+
+def module_stamps(subcommands_dir: Path, module_names: list) -> dict:
+    """return modification time of each subcommand module (None if missing)"""
+    stamps = {}
+    for module_name in module_names:
+        try:
+            stamps[module_name] = os.stat(module_path(subcommands_dir, module_name)).st_mtime_ns
+        except OSError:
+            stamps[module_name] = None
+    return stamps
+
+def load_manifest(manifest_file: Path, subcommands_dir: Path, module_names: list) -> list | None:
+    """load manifest entries, return None if missing or stale"""
+    try:
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(manifest, dict) or manifest.get('version') != MANIFEST_VERSION:
+        return None
+    if manifest.get('modules') != module_stamps(subcommands_dir, module_names):
+        return None
+    return manifest.get('subcommands', [])
+
+def write_manifest(manifest_file: Path, subcommands_dir: Path, module_names: list, entries: list) -> bool:
+    """write manifest entries atomically, return False if not writable"""
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'modules': module_stamps(subcommands_dir, module_names),
+        'subcommands': entries
+    }
+    tmpfile = Path(f'{manifest_file}.{os.getpid()}.tmp')
+    try:
+        tmpfile.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmpfile, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmpfile, manifest_file)
+    except OSError:
+        tmpfile.unlink(missing_ok=True)
+        return False
+    return True
+
+def collect_entries(subparsers, module_name: str, known: set) -> list:
+    """return manifest entries of subcommands registered after known names"""
+    helps = {a.dest: a.help for a in subparsers._choices_actions}
+    names = {}
+    for name, parser in subparsers.choices.items():
+        names.setdefault(id(parser), []).append(name)
+    entries = []
+    for name, *aliases in names.values():
+        if name in known:
+            continue
+        entries.append({
+            'name': name,
+            'aliases': aliases,
+            'help': helps.get(name),
+            'module': module_name
+        })
+    return entries
+
+def detect_subcommand(argv: list, names: set, parent_parsers: list) -> str | None:
+    """return the first subcommand name found in argv
+
+    values of options taking an argument (e.g. "--config FILE", "--conf FILE")
+    are skipped
+    """
+    skip = False
+    positional_only = False
+    for arg in argv:
+        if skip:
+            skip = False
+        elif arg == '--' and not positional_only:
+            positional_only = True
+        elif arg.startswith('-') and not positional_only:
+            skip = option_takes_value(arg, parent_parsers)
+        else:
+            return arg if arg in names else None
+    return None
@@ -0,0 +1,106 @@
+## startup and execution phase profiler
+"""phase timing report enabled by --profile-startup
+
+phase() returns a shared no-op context manager while profiling is disabled
+"""
+import atexit
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+
+## reference time of the report, the earliest point this module is imported
+_START = time.perf_counter()
+_NULL_PHASE = nullcontext()
+
+PROFILE_OPTION = '--profile-startup'
+PROFILE_OUTPUT_OPTION = '--profile-output'
+PROFILE_PSTATS_OPTION = '--profile-pstats'
+
+class StartupProfiler:
+    """collect wall-clock duration of named phases"""
+    def __init__(self, output='-', pstats_file=None):
+        self.output = output
+        self.pstats_file = pstats_file
+        self.phases = []
+        self._depth = 0
+        self._profile = None
+        if pstats_file:
+            import cProfile
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    @contextmanager
+    def phase(self, name: str):
+        """measure a phase, phases may nest"""
+        entry = {'name': name, 'depth': self._depth, 'start': 0.0, 'duration': 0.0}
+        self.phases.append(entry)
+        self._depth += 1
+        t0 = time.perf_counter()
+        try:
+            yield entry
+        finally:
+            t1 = time.perf_counter()
+            self._depth -= 1
+            entry['start'] = t0 - _START
+            entry['duration'] = t1 - t0
+
+    def report(self) -> dict:
+        """return timing report"""
+        return {
+            'argv': sys.argv,
+            'total': time.perf_counter() - _START,
+            'phases': self.phases
+        }
+
+    def finish(self) -> None:
+        """write JSON report (and pstats dump)"""
+        if self._profile is not None:
+            self._profile.disable()
+            self._profile.dump_stats(self.pstats_file)
+        import json
+        out = json.dumps(self.report(), indent=2)
+        if self.output in (None, '-'):
+            print(out, file=sys.stderr)
+        else:
+            with open(self.output, 'w', encoding='utf-8') as f:
+                f.write(out + '\n')
+
+_profiler: StartupProfiler | None = None
+
+def option_value(argv: list, option: str) -> str | None:
+    """return value of "option VALUE" or "option=VALUE" in argv"""
+    for i, arg in enumerate(argv):
+        if arg == option and i + 1 < len(argv):
+            return argv[i + 1]
+        if arg.startswith(option + '='):
+            return arg[len(option) + 1:]
+    return None
+
+def enable(output: str = '-', pstats_file: str | None = None) -> StartupProfiler:
+    """start profiling, report is written by finish() or at interpreter exit"""
+    global _profiler
+    if _profiler is None:
+        atexit.register(finish)
+    _profiler = StartupProfiler(output, pstats_file)
+    return _profiler
+
+def enable_from_argv(argv: list) -> StartupProfiler | None:
+    """start profiling if profiling options are in argv (scanned before argument parsing)"""
+    argv = argv[:argv.index('--')] if '--' in argv else argv
+    pstats_file = option_value(argv, PROFILE_PSTATS_OPTION)
+    if PROFILE_OPTION not in argv and pstats_file is None:
+        return None
+    return enable(option_value(argv, PROFILE_OUTPUT_OPTION) or '-', pstats_file)
+
+def finish() -> None:
+    """stop profiling and write report"""
+    global _profiler
+    if _profiler is not None:
+        profiler, _profiler = _profiler, None
+        profiler.finish()
+
+def phase(name: str):
+    """context manager measuring a phase, no-op if profiling is disabled"""
+    if _profiler is None:
+        return _NULL_PHASE
+    return _profiler.phase(name)
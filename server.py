@@ -0,0 +1,136 @@
+## warm server mode
+"""keep an initialized process (config, parser, subcommand modules) resident on a Unix socket
+
+the server forks per request; the child takes over the client's stdio file
+descriptors, cwd, environment, umask and argv, runs the request and reports its
+exit status to the client (client.py)
+"""
+import os
+import signal
+import socket
+import struct
+import sys
+import traceback
+from pathlib import Path
+
+from client import recv_message, send_message
+
+## request header up to this size is read with the file descriptors
+SERVER_RECV_SIZE = 1 << 16
+SERVER_BACKLOG = 128
+
+def peer_uid(conn: socket.socket) -> int | None:
+    """return uid of connected peer, None if the platform cannot tell"""
+    if not hasattr(socket, 'SO_PEERCRED'):
+        return None
+    creds = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+    return struct.unpack('3i', creds)[1]
+
+def _receive_request(conn: socket.socket):
+    """return (request, fds) sent by client.forward"""
+    data, fds, _, _ = socket.recv_fds(conn, SERVER_RECV_SIZE, 3)
+    buf = bytearray(data)
+    request = recv_message(conn, buf)
+    if request is None or len(fds) != 3:
+        for fd in fds:
+            os.close(fd)
+        raise ConnectionError('incomplete request')
+    return request, fds
+
+def _run_request(conn: socket.socket, run, check, stale) -> None:
+    """run one request in forked child"""
+    request, fds = _receive_request(conn)
+    os.chdir(request['cwd'])
+    os.environ.clear()
+    os.environ.update(request['env'])
+    os.umask(request['umask'])
+    argv = request['argv']
+
+    ## decline requests the resident state does not fit, the client runs them locally
+    reason = None
+    if stale is not None and stale():
+        reason = 'package changed, server stopped'
+        os.kill(os.getppid(), signal.SIGTERM)
+    elif check is not None:
+        try:
+            reason = check(argv)
+        except SystemExit:
+            reason = 'invalid arguments'
+    if reason is not None:
+        send_message(conn, {'fallback': reason})
+        return
+
+    ## take over client stdio
+    for fd, target in zip(fds, (0, 1, 2)):
+        os.dup2(fd, target)
+        os.close(fd)
+    sys.argv = [sys.argv[0], *argv]
+    send_message(conn, {'pid': os.getpid()})
+    status = run(argv)
+    for stream in (sys.stdout, sys.stderr):
+        try:
+            stream.flush()
+        except (OSError, ValueError):
+            pass
+    send_message(conn, {'exit': status})
+
+def _stop(signum, frame):
+    raise SystemExit(0)
+
+def serve(socket_path, run, check=None, stale=None, backlog: int = SERVER_BACKLOG) -> None:
+    """accept requests on socket_path until SIGTERM/SIGINT, fork per request
+
+    - run(argv): runs a request (in the forked child) and returns its exit status,
+      it does the request's exit work itself (atexit handlers are not run in children)
+    - check(argv): reason to decline argv (client runs it locally), None to run it
+    - stale(): True if the resident state is outdated, the server then stops
+    only peers of the same uid are served (socket file mode 0600)
+    """
+    path = Path(socket_path)
+    if path.is_socket():
+        path.unlink()
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    umask = os.umask(0o177)
+    try:
+        sock.bind(str(path))
+    finally:
+        os.umask(umask)
+    sock.listen(backlog)
+    inode = path.stat().st_ino
+    uid = os.getuid()
+
+    ## children are reaped by the kernel
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, _stop)
+    sys.stdout.flush()
+    sys.stderr.flush()
+    try:
+        while True:
+            conn, _ = sock.accept()
+            with conn:
+                if peer_uid(conn) not in (uid, None):
+                    continue
+                if os.fork() != 0:
+                    continue
+                ## child
+                status = 1
+                try:
+                    sock.close()
+                    for signum in (signal.SIGCHLD, signal.SIGTERM):
+                        signal.signal(signum, signal.SIG_DFL)
+                    signal.signal(signal.SIGINT, signal.default_int_handler)
+                    _run_request(conn, run, check, stale)
+                    status = 0
+                except BaseException:
+                    traceback.print_exc()
+                finally:
+                    os._exit(status)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sock.close()
+        try:
+            if path.stat().st_ino == inode:
+                path.unlink()
+        except OSError:
+            pass
@@ -16,10 +16,8 @@ config.append_config(ConfigSubCommand)
 logger = get_logger()
 
 def register_subcommand(subparsers, parent_parsers):
-    ## subcommand defaults
-    conf_dict = config.to_dict()
-    yaml_default = config.params.get('command', {}).get('template', {})
-    defaults = {**conf_dict, **yaml_default}
+    ## subcommand defaults (config fields < command.template section of package/user config)
+    defaults = config.command_defaults('template')
 
     ## subcommand argument
     parser_subcommand = subparsers.add_parser(
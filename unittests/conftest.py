@@ -0,0 +1,7 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache_dir(tmp_path, monkeypatch):
+    # keep YAML/parser/manifest caches of tests out of the user's ~/.cache
+    monkeypatch.setenv('SUBCOMMAND_CACHE_DIR', str(tmp_path / 'cache'))
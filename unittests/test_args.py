@@ -1,6 +1,6 @@
 import argparse
 
-from args import ListArgumentAction, config_arguments, build_root_parser
+from args import ListArgumentAction, config_arguments, mode_arguments, root_argv, build_root_parser
 from template.package_config import positional_arguments
 
 
@@ -28,3 +28,9 @@ def test_build_root_parser_creates_subparsers():
     assert getattr(subparsers, 'dest', None) == 'command'
     usage = parser.format_usage()
     assert '[subcommand]' in usage
+
+
+def test_root_argv_stops_at_subcommand_and_skips_option_values():
+    parents = [config_arguments(['.app']), mode_arguments()]
+    assert root_argv(['--conf', 'c.yaml', '--serve', 's', 'run', '--batch', 'f'], parents) == ['--conf', 'c.yaml', '--serve', 's']
+    assert root_argv(['--config=run', '--batch-j', '2', '--', '--serve', 's'], parents) == ['--config=run', '--batch-j', '2']
@@ -0,0 +1,93 @@
+import argparse
+import os
+import pickle
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from args import (CustomHelpFormatter, ListArgumentAction, SpecError, build_root_parser,
+                  dump_parser_spec, build_parser_from_spec, build_subparser_from_spec, parser_spec_subcommands)
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'benchmarks'))
+from synthetic import make_package
+
+
+def handler(args):
+    return 'handled'
+
+
+def make_parser():
+    parent = argparse.ArgumentParser(add_help=False)
+    group = parent.add_argument_group('common options')
+    group.add_argument('--verbose', action='store_true')
+    group.add_argument('--version', action='version', version='%(prog)s 1.0')
+    parser, subparsers = build_root_parser('prog', 'desc', [parent])
+    sub = subparsers.add_parser('run', aliases=['r'], help='run help', formatter_class=CustomHelpFormatter, parents=[parent])
+    sub.set_defaults(handler=handler)
+    sub.add_argument('--items', action=ListArgumentAction, default=['a'])
+    sub.add_argument('--count', type=int, default=3)
+    mutex = sub.add_mutually_exclusive_group()
+    mutex.add_argument('--fast', action='store_true')
+    mutex.add_argument('--slow', action='store_true')
+    sub.add_argument('target', nargs='+')
+    subparsers.add_parser('other', help='other help')
+    return parser
+
+
+def rebuild(spec, command):
+    spec = pickle.loads(pickle.dumps(spec))
+    parser, subparsers = build_parser_from_spec(spec)
+    build_subparser_from_spec(subparsers, spec, command)
+    return parser
+
+
+def test_spec_roundtrip_keeps_help_and_parsing():
+    parser = make_parser()
+    spec = dump_parser_spec(parser, {'run': 'mod_run', 'r': 'mod_run', 'other': 'mod_other'})
+    rebuilt = rebuild(spec, 'r')
+    assert rebuilt.format_help() == parser.format_help()
+    argv = ['r', '--items', 'x,y', '--count', '5', '--fast', 'f1', 'f2']
+    assert vars(rebuilt.parse_args(argv)) == vars(parser.parse_args(argv))
+    assert rebuilt.parse_args(argv).handler is handler
+    with pytest.raises(SystemExit):
+        rebuilt.parse_args(['run', '--fast', '--slow', 'f'])
+
+
+def test_spec_placeholder_builds_parser_when_selected():
+    parser = make_parser()
+    spec = pickle.loads(pickle.dumps(dump_parser_spec(parser, {'run': 'mod_run', 'r': 'mod_run'})))
+    loaded = []
+    rebuilt, _ = build_parser_from_spec(spec, loaded.append)
+    args, extras = rebuilt.parse_known_args(['r', '--count', '5', 'f'])
+    args.load_subcommand()
+    assert loaded == ['run']
+    argv = ['r', '--count', '5', 'f']
+    assert vars(rebuilt.parse_args(argv)) == vars(parser.parse_args(argv))
+
+
+@pytest.mark.parametrize('args', [['--logl', 'INFO', 'cmd1', '-h'], ['--loglevel=INFO', 'cmd1', '-h']])
+def test_cached_parser_detects_subcommand_after_root_options(tmp_path, args):
+    pkg = make_package(tmp_path, 3, package={'parser_cache': True})
+    ## first run builds and stores the parser, second run rebuilds it from the cache
+    for _ in range(2):
+        proc = subprocess.run([sys.executable, str(pkg), *args], capture_output=True, text=True)
+        assert proc.returncode == 0, proc.stderr
+        assert 'cmd1 options' in proc.stdout
+    assert any(Path(os.environ['SUBCOMMAND_CACHE_DIR']).rglob('parser.pickle'))
+
+
+def test_spec_subcommand_entries():
+    spec = dump_parser_spec(make_parser(), {'run': 'mod_run', 'other': 'mod_other'})
+    assert parser_spec_subcommands(spec) == [
+        {'name': 'run', 'aliases': ['r'], 'help': 'run help', 'module': 'mod_run'},
+        {'name': 'other', 'aliases': [], 'help': 'other help', 'module': 'mod_other'},
+    ]
+
+
+def test_spec_rejects_local_callables():
+    parser = argparse.ArgumentParser()
+    parser.set_defaults(handler=lambda args: None)
+    with pytest.raises(SpecError):
+        dump_parser_spec(parser)
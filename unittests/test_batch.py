@@ -0,0 +1,89 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'benchmarks'))
+from synthetic import make_package
+
+
+@pytest.mark.parametrize('jobs', ['1', '2'])
+def test_batch_runs_lines_with_one_parser(tmp_path, jobs):
+    pkg = make_package(tmp_path, 3)
+    env = {**os.environ, 'SUBCOMMAND_CACHE_DIR': str(tmp_path / 'cache')}
+    report = tmp_path / 'report.jsonl'
+    proc = subprocess.run(
+        [sys.executable, str(pkg), '--batch', '-', '--batch-jobs', jobs, '--batch-report', str(report)],
+        input='# comment\ncmd0 a\n\n["cmd1", "b c"]\ncmd2\ncmd2 \'x y\' --opt0 5\n', env=env, capture_output=True, text=True
+    )
+    assert proc.returncode == 1
+    assert 'the following arguments are required' in proc.stderr
+    lines = [json.loads(line) for line in report.read_text().splitlines()]
+    assert [(x['line'], x['status']) for x in lines] == [(2, 0), (4, 0), (5, 2), (6, 0)]
+    assert lines[1]['argv'] == ['cmd1', 'b c'] and lines[3]['argv'] == ['cmd2', 'x y', '--opt0', '5']
+
+
+def test_batch_rejects_invalid_json_line(tmp_path):
+    pkg = make_package(tmp_path, 1)
+    batch = tmp_path / 'batch.txt'
+    batch.write_text('cmd0 a\n["cmd0", 1]\n')
+    env = {**os.environ, 'SUBCOMMAND_CACHE_DIR': ''}
+    proc = subprocess.run([sys.executable, str(pkg), '--batch', str(batch)], env=env, capture_output=True, text=True)
+    assert proc.returncode == 2 and 'batch.txt:2: JSON line must be an array of strings' in proc.stderr
+    assert 'Traceback' not in proc.stderr
+
+
+@pytest.mark.parametrize('args, error', [
+    (['--batch', 'missing.txt'], 'No such file or directory'),
+    (['--batch', '-', '--batch-jobs', 'x'], "argument --batch-jobs: invalid positive_int value: 'x'"),
+    (['--batch', '-', '--batch-jobs', '0'], 'argument --batch-jobs: must be at least 1'),
+    (['--batch', '-', '--batch-report', 'missing/report.jsonl'], 'No such file or directory'),
+    (['--batch', '-', 'cmd0', 'x'], '--batch takes command lines from FILE, not from argv: cmd0 x'),
+])
+def test_batch_reports_invalid_options(tmp_path, args, error):
+    pkg = make_package(tmp_path, 1)
+    proc = subprocess.run([sys.executable, str(pkg), *args], cwd=tmp_path, input='', capture_output=True, text=True)
+    assert proc.returncode == 2 and error in proc.stderr
+    assert 'Traceback' not in proc.stderr
+
+
+def test_batch_options_only_before_subcommand(tmp_path):
+    pkg = make_package(tmp_path, 1)
+    proc = subprocess.run([sys.executable, str(pkg), '--help'], capture_output=True, text=True)
+    assert all(option in proc.stdout for option in ('--batch FILE', '--batch-jobs N', '--batch-report FILE'))
+    proc = subprocess.run([sys.executable, str(pkg), 'cmd0', '--', '--batch', '/nonexistent'], capture_output=True, text=True)
+    assert proc.returncode == 0 and 'Traceback' not in proc.stderr
+
+
+def test_batch_restores_params_between_lines(tmp_path):
+    pkg = make_package(tmp_path, 1)
+    (pkg / 'subcommand' / 'cmd0.py').write_text(
+        "from config import config\n"
+        "def register_subcommand(subparsers, parent_parsers):\n"
+        "    subparsers.add_parser('cmd0', parents=parent_parsers).set_defaults(handler=cmd)\n"
+        "def cmd(args):\n"
+        "    print(config.params['package']['description'])\n"
+        "    config.params['package']['description'] = 'changed'\n"
+    )
+    proc = subprocess.run([sys.executable, str(pkg), '--batch', '-'], input='cmd0 a\ncmd0 b\n', capture_output=True, text=True)
+    assert proc.returncode == 0, proc.stderr
+    assert proc.stdout.splitlines() == ['synthetic package', 'synthetic package']
+
+
+def test_batch_applies_root_options_to_every_line(tmp_path):
+    pkg = make_package(tmp_path, 1)
+    (pkg / 'subcommand' / 'cmd0.py').write_text(
+        "def register_subcommand(subparsers, parent_parsers):\n"
+        "    subparsers.add_parser('cmd0', parents=parent_parsers).set_defaults(handler=cmd)\n"
+        "def cmd(args):\n"
+        "    print(args.verbose, args.loglevel, args.target)\n"
+    )
+    proc = subprocess.run(
+        [sys.executable, str(pkg), '--verb', '--loglevel', 'DEBUG', '--batch', '-'],
+        input='cmd0 a\ncmd0 --loglevel INFO b\n', capture_output=True, text=True
+    )
+    assert proc.returncode == 0, proc.stderr
+    assert proc.stdout.splitlines() == ["True DEBUG ['a']", "True INFO ['b']"]
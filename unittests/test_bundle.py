@@ -0,0 +1,56 @@
+import os
+import subprocess
+import sys
+import zipfile
+
+from bundle import bundle_archive, build_bundle, package_file, read_package_file
+from configfile import load_package_config
+
+
+def make_bundle(tmp_path, **kwargs):
+    src = tmp_path / 'src'
+    (src / 'data').mkdir(parents=True)
+    (src / '__main__.py').write_text('import sys\nimport helper\nprint(helper.VALUE, sys.argv[1:])\n')
+    (src / 'helper.py').write_text('VALUE = 42\n')
+    (src / 'package_config.yaml').write_text('package:\n  prog: app\n')
+    (src / 'data' / 'table.txt').write_text('table')
+    files = ['__main__.py', 'helper.py', 'package_config.yaml', 'data/table.txt']
+    return build_bundle(src, tmp_path / 'app.pyz', files, **kwargs)
+
+
+def test_build_bundle_runs_with_precompiled_modules(tmp_path):
+    bundle = make_bundle(tmp_path)
+    assert os.access(bundle, os.X_OK)
+    with zipfile.ZipFile(bundle) as z:
+        names = z.namelist()
+        assert {'helper.py', 'helper.pyc', '__main__.pyc', 'data/table.txt'} <= set(names)
+        flags = int.from_bytes(z.read('helper.pyc')[4:8], 'little')
+        assert flags == 0b01  # unchecked hash based
+    proc = subprocess.run([sys.executable, str(bundle), 'a'], stdout=subprocess.PIPE, text=True, check=True)
+    assert proc.stdout == "42 ['a']\n"
+
+
+def test_files_inside_bundle(tmp_path, monkeypatch):
+    monkeypatch.setenv('SUBCOMMAND_CACHE_DIR', '')
+    bundle = make_bundle(tmp_path, invalidation_mode='none')
+    with zipfile.ZipFile(bundle) as z:
+        assert 'helper.pyc' not in z.namelist()
+    assert bundle_archive(bundle / 'data' / 'table.txt') == bundle
+    assert bundle_archive(tmp_path / 'src' / 'helper.py') is None
+    assert package_file(bundle / 'data' / 'table.txt').read_text() == 'table'
+    assert not package_file(bundle / 'data' / 'missing').is_file()
+    data, size, mtime_ns = read_package_file(bundle / 'helper.py')
+    assert data == b'VALUE = 42\n' and size == len(data) and mtime_ns == os.stat(bundle).st_mtime_ns
+    assert load_package_config(bundle) == {'package': {'prog': 'app'}}
+
+
+def test_bundle_pycs_keep_docstrings_and_asserts(tmp_path):
+    src = tmp_path / 'src'
+    src.mkdir()
+    (src / '__main__.py').write_text('import helper\nprint(helper.check())\n')
+    (src / 'helper.py').write_text('"""doc"""\ndef check():\n    try:\n        assert False\n    except AssertionError:\n        return __doc__\n')
+    bundle = build_bundle(src, tmp_path / 'app.pyz', ['__main__.py', 'helper.py'])
+    with zipfile.ZipFile(bundle) as z:
+        assert 'helper.pyc' in z.namelist()
+    proc = subprocess.run([sys.executable, str(bundle)], stdout=subprocess.PIPE, text=True, check=True)
+    assert proc.stdout == 'doc\n'
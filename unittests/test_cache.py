@@ -0,0 +1,28 @@
+from cache import cache_dir, cache_key, file_fingerprint, load_cache, store_cache
+
+
+def test_cache_dir_env(monkeypatch, tmp_path):
+    monkeypatch.setenv('SUBCOMMAND_CACHE_DIR', str(tmp_path))
+    assert cache_dir('prog') == tmp_path / 'prog'
+    monkeypatch.setenv('SUBCOMMAND_CACHE_DIR', '')
+    assert cache_dir('prog') is None
+
+
+def test_store_and_load_cache(tmp_path):
+    cache_file = tmp_path / 'sub' / 'data.pickle'
+    assert load_cache(cache_file) is None
+    assert store_cache(cache_file, {'a': [1, 2]})
+    assert load_cache(cache_file) == {'a': [1, 2]}
+    cache_file.write_bytes(b'broken')
+    assert load_cache(cache_file) is None
+
+
+def test_file_fingerprint_changes_with_content(tmp_path):
+    f = tmp_path / 'f.yaml'
+    f.write_text('a: 1\n')
+    fp1 = file_fingerprint(f)
+    f.write_text('a: 2\n')
+    fp2 = file_fingerprint(f)
+    assert fp1 != fp2
+    assert file_fingerprint(tmp_path / 'missing') is None
+    assert cache_key(fp1) != cache_key(fp2)
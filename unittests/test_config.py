@@ -1,6 +1,7 @@
+import argparse
 import pytest
 from dataclasses import dataclass, field
-from config import GlobalConfig, config
+from config import GlobalConfig, LayeredConfig, config
 
 
 def teardown_function(function):
@@ -63,3 +64,195 @@ def test_extend_schema_merges_fields():
     # set new field
     GlobalConfig.set('y', 'hello')
     assert GlobalConfig.get('y') == 'hello'
+
+
+def test_values_and_view_do_not_copy():
+    @dataclass
+    class Sample:
+        params: dict = field(default_factory=dict)
+        n: int = 0
+
+    GlobalConfig.set_config(Sample(params={'big': [1, 2, 3]}))
+    params = GlobalConfig.get('params')
+    assert GlobalConfig.values()[0] is params
+    assert dict(GlobalConfig.items())['params'] is params
+    assert GlobalConfig.count() == 2
+
+    view = config.view()
+    assert view['params'] is params
+    assert list(view) == ['params', 'n']
+    config.n = 7
+    assert view['n'] == 7
+    with pytest.raises(KeyError):
+        view['missing']
+
+
+def test_field_index_follows_schema_changes():
+    @dataclass
+    class Base:
+        x: int = 1
+
+    @dataclass
+    class Extra:
+        y: int = 2
+
+    GlobalConfig.set_config(Base())
+    with pytest.raises(AttributeError):
+        config.y
+    GlobalConfig.extend_schema(Extra)
+    assert config.y == 2
+    assert GlobalConfig.keys() == ('x', 'y')
+    GlobalConfig.reset()
+    with pytest.raises(RuntimeError):
+        GlobalConfig.get('x')
+
+
+def test_extend_schema_composes_once_on_access(monkeypatch):
+    import config as config_module
+
+    @dataclass
+    class Base:
+        x: int = 1
+
+    fragments = [make_fragment(i) for i in range(5)]
+    GlobalConfig.set_config(Base())
+    calls = []
+    compose = config_module.compose_schema
+    monkeypatch.setattr(config_module, 'compose_schema', lambda merged, **kw: calls.append(1) or compose(merged, **kw))
+    config.x = 3 # existing field is accessible while fragments are pending
+    for fragment in fragments:
+        config.append_config(fragment)
+    assert calls == []
+    assert config.f4 == 4
+    assert GlobalConfig.keys() == ('x', 'f0', 'f1', 'f2', 'f3', 'f4')
+    assert config.x == 3
+    assert calls == [1]
+
+
+def test_extend_schema_reuses_class_of_same_signature():
+    @dataclass
+    class Base:
+        x: int = 1
+
+    GlobalConfig.set_config(Base())
+    GlobalConfig.extend_schema(make_fragment(0))
+    first = type(GlobalConfig.get_config())
+    GlobalConfig.set_config(Base())
+    GlobalConfig.extend_schema(make_fragment(0))
+    assert type(GlobalConfig.get_config()) is first
+
+
+def test_compose_schema_distinguishes_equal_defaults_of_other_type():
+    from dataclasses import fields
+    from config import compose_schema
+
+    @dataclass
+    class Zero:
+        x: int = 0
+
+    @dataclass
+    class No:
+        x: int = False
+
+    for cls, default in ((Zero, 0), (No, False), (Zero, 0)):
+        composed = compose_schema({f.name: f for f in fields(cls)})
+        assert type(composed().x) is type(default)
+
+
+def test_extend_schema_rejects_non_dataclass_immediately():
+    with pytest.raises(TypeError):
+        GlobalConfig.extend_schema(dict)
+
+
+def test_slotted_schema_and_frozen_snapshot():
+    import dataclasses
+
+    @dataclass
+    class Base:
+        x: int = 1
+        params: dict = field(default_factory=dict)
+
+    GlobalConfig.set_slots(True)
+    try:
+        GlobalConfig.set_config(Base(params={'a': [1, 2], 'b': {'c': 3}}))
+        GlobalConfig.extend_schema(make_fragment(0))
+        assert not hasattr(GlobalConfig.get_config(), '__dict__')
+    finally:
+        GlobalConfig.set_slots(False)
+
+    snapshot = config.freeze()
+    assert not hasattr(snapshot, '__dict__')
+    assert snapshot.x == 1 and snapshot.f0 == 0
+    assert snapshot.params['a'] == (1, 2)
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        snapshot.x = 2
+    with pytest.raises(TypeError):
+        snapshot.params['b']['c'] = 4
+
+    # snapshot is detached from later changes
+    config.x = 5
+    assert snapshot.x == 1
+
+
+def make_fragment(i):
+    from dataclasses import make_dataclass
+    return make_dataclass(f'Fragment{i}', [(f'f{i}', int, field(default=i))])
+
+
+def test_layered_config_resolves_without_copy_and_records_source():
+    package = {'package': {'prog': 'p'}, 'command': {'run': {'count': 1, 'name': 'a'}}, 'common': {'x': 1}}
+    user = {'command': {'run': {'count': 2}}}
+    params = LayeredConfig.of(package).with_layer('user', user)
+    assert params.layers == ('user', 'package')
+    assert params['package'] is package['package']
+    assert params.source('package') == 'package' and params.source('command') == 'user'
+    assert params.source('missing') is None
+    run = params.section('command', 'run')
+    assert dict(run) == {'count': 2, 'name': 'a'}
+    assert run.sources() == {'count': 'user', 'name': 'package'}
+    user['command']['run']['count'] = 3  # live view of layers
+    assert run['count'] == 3
+    assert params.layer('user') is user
+    with pytest.raises(KeyError):
+        params.layer('cli')
+    assert params.to_dict()['common'] == {'x': 1}
+
+
+def test_command_defaults_layers():
+    @dataclass
+    class Sample:
+        count: int = 0
+        other: str = 'o'
+        params: dict = field(default_factory=dict)
+
+    GlobalConfig.set_config(Sample(params=LayeredConfig.of({'command': {'run': {'count': 5}}})))
+    defaults = config.command_defaults('run')
+    assert defaults['count'] == 5 and defaults['other'] == 'o'
+    assert defaults.source('count') == 'command.run' and defaults.source('other') == 'config'
+    assert defaults.layer('command.run').source('count') == 'package'
+    args = argparse.Namespace(count=7)
+    defaults = config.command_defaults('run', args)
+    assert defaults['count'] == 7 and defaults.source('count') == 'cli'
+    # plain dict params and missing section
+    GlobalConfig.set('params', {})
+    assert config.command_defaults('run')['count'] == 0
+
+
+def test_snapshot_restore_resets_values():
+    @dataclass
+    class Sample:
+        count: int = 1
+        entries: list = field(default_factory=list)
+        params: dict = field(default_factory=dict)
+
+    params = LayeredConfig.of({'package': {'prog': 'p'}}).with_layer('user', {'command': {}})
+    GlobalConfig.set_config(Sample(entries=[1], params=params))
+    base = GlobalConfig.snapshot()
+    for _ in range(2):
+        GlobalConfig.restore(base)
+        assert config.count == 1 and config.entries == [1]
+        assert config.params['package'] == {'prog': 'p'} and config.params.layers == ('user', 'package')
+        config.count = 2
+        config.entries.append(2)
+        config.params['package']['prog'] = 'changed'  # nested values of layers are mutable
+    assert params['package'] == {'prog': 'p'}
@@ -1,6 +1,7 @@
 import pytest
 from dataclasses import dataclass, field
 from pathlib import Path, PosixPath
+from typing import Literal, Optional
 
 from configfile import initialize_params
 
@@ -37,3 +38,78 @@ def test_initialize_params_conversion(tmp_path):
     assert out['e'] is True
     assert isinstance(out['p'], Path)
     assert str(out['p']) == str(tmp_path)
+
+
+def test_load_yaml_uses_and_invalidates_cache(tmp_path, monkeypatch):
+    import os
+    import yaml
+    from configfile import load_yaml, yaml_cache_file
+
+    monkeypatch.setenv('SUBCOMMAND_CACHE_DIR', str(tmp_path / 'cache'))
+    f = tmp_path / 'conf.yaml'
+    f.write_text('package:\n  prog: app\n')
+    assert load_yaml(f) == {'package': {'prog': 'app'}}
+    assert yaml_cache_file(f).is_file()
+
+    # cached document is returned without parsing
+    yaml_load = yaml.load
+    def fail(*args, **kwargs):
+        raise AssertionError('parsed again')
+    monkeypatch.setattr(yaml, 'load', fail)
+    assert load_yaml(f) == {'package': {'prog': 'app'}}
+    monkeypatch.setattr(yaml, 'load', yaml_load)
+
+    # same size and mtime but different content is detected by hash
+    st = os.stat(f)
+    f.write_text('package:\n  prog: xyz\n')
+    os.utime(f, ns=(st.st_atime_ns, st.st_mtime_ns))
+    assert load_yaml(f) == {'package': {'prog': 'xyz'}}
+
+
+def test_load_package_config_rejects_non_mapping(tmp_path, monkeypatch):
+    from configfile import load_package_config
+    monkeypatch.setenv('SUBCOMMAND_CACHE_DIR', '')
+    (tmp_path / 'package_config.yaml').write_text('- a\n- b\n')
+    with pytest.raises(ValueError):
+        load_package_config(tmp_path)
+
+
+@dataclass
+class JobConfig:
+    name: str
+    count: Optional[int] = None
+    ids: list[int] = field(default_factory=list)
+    weights: dict[str, float] = field(default_factory=dict)
+    out: Path = Path('.')
+    mode: Literal['fast', 'slow'] = 'fast'
+    enabled: bool = True
+
+
+def test_compiled_converter_handles_annotations():
+    from configfile import compile_params, ParamsValidationError
+    assert compile_params(JobConfig) is compile_params(JobConfig)
+    out = initialize_params(JobConfig, {
+        'name': 'job', 'count': '4', 'ids': ('1', 2), 'weights': {'a': '0.5'}, 'out': '/tmp', 'enabled': 'off'
+    }, strict=True)
+    assert out == {
+        'name': 'job', 'count': 4, 'ids': [1, 2], 'weights': {'a': 0.5}, 'out': Path('/tmp'), 'mode': 'fast', 'enabled': False
+    }
+    assert initialize_params(JobConfig, {'name': 'x', 'count': None}, strict=True)['count'] is None
+    with pytest.raises(ParamsValidationError) as e:
+        initialize_params(JobConfig, {'count': 'many', 'ids': 'abc', 'mode': 'other', 'enabled': 'maybe'}, strict=True)
+    assert [msg.split(':')[0] for msg in e.value.errors] == ['name', 'count', 'ids', 'mode', 'enabled']
+    # not strict: unconvertible values are kept as given
+    assert initialize_params(JobConfig, {'name': 'x', 'count': 'many'})['count'] == 'many'
+
+
+def test_initialize_params_many_collects_errors():
+    from configfile import initialize_params_many, ParamsValidationError
+    records = [{'name': 'a', 'count': '1'}, {'name': 'b', 'count': 'x'}, {'count': '2'}]
+    with pytest.raises(ParamsValidationError) as e:
+        initialize_params_many(JobConfig, records)
+    assert sorted(e.value.records) == [1, 2]
+    assert e.value.errors[0].startswith('[1] count:') and e.value.errors[1] == '[2] name: missing'
+    out = initialize_params_many(JobConfig, records, return_exceptions=True)
+    assert out[0]['count'] == 1
+    assert isinstance(out[1], ParamsValidationError) and isinstance(out[2], ParamsValidationError)
+    assert initialize_params_many(JobConfig, records[:1]) == [initialize_params(JobConfig, records[0])]
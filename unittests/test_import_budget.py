@@ -0,0 +1,55 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'benchmarks'))
+from synthetic import make_package
+
+## import budget of a warm (cached) invocation: module count and summed
+## cumulative time of top-level imports in microseconds (-X importtime)
+IMPORT_BUDGET_MODULES = int(os.environ.get('IMPORT_BUDGET_MODULES', 145))
+IMPORT_BUDGET_US = int(os.environ.get('IMPORT_BUDGET_US', 1_000_000))
+
+## modules which must only be imported on the paths using them
+LAZY_MODULES = {'yaml', 'tarfile', 'zipfile', 'datetime', 'logging.config', 'logging.handlers', 'csv', 'concurrent.futures'}
+
+
+def import_times(pkg, *args, env=None) -> list:
+    """return [(module, self us, cumulative us, depth)] of a python -X importtime run"""
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', str(pkg), *args],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, env=env
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or line.endswith('| imported package'):
+            continue
+        self_us, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative), depth))
+    return rows
+
+
+@pytest.fixture(scope='module')
+def package(tmp_path_factory):
+    root = tmp_path_factory.mktemp('budget')
+    env = {**os.environ, 'SUBCOMMAND_CACHE_DIR': str(root / 'cache')}
+    pkg = make_package(root, 10)
+    ## warm manifest and config caches
+    for args in (['--help'], ['cmd0', 'x']):
+        subprocess.run([sys.executable, str(pkg), *args], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env)
+    return pkg, env
+
+
+@pytest.mark.parametrize('args', [['--help'], ['cmd0', 'x']])
+def test_import_budget(package, args):
+    pkg, env = package
+    rows = import_times(pkg, *args, env=env)
+    modules = {name for name, *_ in rows}
+    assert not modules & LAZY_MODULES
+    assert len(rows) <= IMPORT_BUDGET_MODULES, f'{len(rows)} modules imported'
+    total = sum(cumulative for _, _, cumulative, depth in rows if depth == 0)
+    assert total <= IMPORT_BUDGET_US, f'{total} us import time'
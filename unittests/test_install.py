@@ -0,0 +1,100 @@
+import argparse
+import os
+
+from install import package_installation, sync_files, package_files, INSTALL_MANIFEST_FILE
+
+
+def make_package(path):
+    pkg = path / 'pkg'
+    (pkg / 'subcommand').mkdir(parents=True)
+    (pkg / 'data' / 'sub').mkdir(parents=True)
+    (pkg / 'main.py').write_text('main')
+    (pkg / 'subcommand' / 'cmd.py').write_text('cmd')
+    (pkg / 'data' / 'sub' / 'table.txt').write_text('table')
+    (pkg / 'package_config.yaml').write_text('package: {}')
+    return pkg
+
+
+def test_package_files_include_subcommand_and_nested_data(tmp_path):
+    pkg = make_package(tmp_path)
+    assert [p.as_posix() for p in package_files(pkg)] == [
+        'data/sub/table.txt', 'main.py', 'package_config.yaml', 'subcommand/cmd.py'
+    ]
+
+
+def test_sync_copies_changed_and_removes_stale(tmp_path):
+    pkg = make_package(tmp_path)
+    install = tmp_path / 'install'
+    result = sync_files(pkg, install, package_files(pkg))
+    assert len(result['copied']) == 4
+    assert (install / INSTALL_MANIFEST_FILE).is_file()
+    assert (install / 'data' / 'sub' / 'table.txt').read_text() == 'table'
+
+    result = sync_files(pkg, install, package_files(pkg))
+    assert result['copied'] == [] and len(result['skipped']) == 4
+
+    ## touched without change, changed content, removed file
+    st = os.stat(pkg / 'main.py')
+    os.utime(pkg / 'main.py', ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    (pkg / 'subcommand' / 'cmd.py').write_text('cmd v2')
+    (pkg / 'data' / 'sub' / 'table.txt').unlink()
+    result = sync_files(pkg, install, package_files(pkg))
+    assert [p.as_posix() for p in result['copied']] == ['subcommand/cmd.py']
+    assert [p.as_posix() for p in result['removed']] == ['data/sub/table.txt']
+    assert (install / 'subcommand' / 'cmd.py').read_text() == 'cmd v2'
+    assert not (install / 'data' / 'sub' / 'table.txt').exists()
+    assert not [f for f in os.listdir(install) if f.endswith('.tmp')]
+
+
+def test_package_installation_creates_script(tmp_path):
+    pkg = make_package(tmp_path)
+    args = argparse.Namespace(
+        packagedir=str(pkg), installdir=str(tmp_path / 'local' / 'pkg'), execdir=None,
+        scriptname='pkg', pythoncmd='python3', sync=True, jobs=2
+    )
+    package_installation(args)
+    assert (tmp_path / 'local' / 'bin' / 'pkg').is_file()
+    assert (tmp_path / 'local' / 'pkg' / 'subcommand' / 'cmd.py').is_file()
+
+
+def test_precompile_hash_based_pycs(tmp_path):
+    import importlib.util
+    import sys
+    from install import precompile
+    pkg = make_package(tmp_path)
+    (pkg / 'main.py').write_text('x = 1\n')
+    (pkg / 'subcommand' / 'cmd.py').write_text('y = 2\n')
+    install = tmp_path / 'install'
+    sync_files(pkg, install, package_files(pkg))
+    assert precompile(install, sys.executable, optimize=[0, 1], invalidation_mode='unchecked-hash')
+    for source in (install / 'main.py', install / 'subcommand' / 'cmd.py'):
+        for level in ('', 1):
+            pyc = importlib.util.cache_from_source(str(source), optimization=level)
+            with open(pyc, 'rb') as f:
+                flags = int.from_bytes(f.read(8)[4:], 'little')
+            assert flags == 0b01  # hash based, unchecked
+    assert not (install / 'data' / '__pycache__').exists()
+    assert precompile(install, sys.executable, files=[], invalidation_mode='checked-hash')
+    assert not precompile(install, 'no-such-python-command')
+
+
+def test_sync_recompiles_unchanged_files_when_settings_change(tmp_path):
+    import importlib.util
+    import sys
+    pkg = make_package(tmp_path)
+    (pkg / 'main.py').write_text('x = 1\n')
+    (pkg / 'subcommand' / 'cmd.py').write_text('y = 2\n')
+    install = tmp_path / 'local' / 'pkg'
+    def run(**kwargs):
+        args = argparse.Namespace(
+            packagedir=str(pkg), installdir=str(install), execdir=None, scriptname='pkg',
+            pythoncmd=sys.executable, sync=True, jobs=1, **kwargs
+        )
+        package_installation(args)
+    run(precompile='checked-hash', optimize=[0])
+    pyc = importlib.util.cache_from_source(str(install / 'subcommand' / 'cmd.py'), optimization=2)
+    assert not os.path.exists(pyc)
+    run(precompile='checked-hash', optimize=[2])
+    assert os.path.exists(pyc)
+    assert sync_files(pkg, install, package_files(pkg))['precompile_changed']
+    assert (install / 'main.py').is_file()
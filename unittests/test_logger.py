@@ -1,5 +1,6 @@
+import sys
 import tempfile
-from logger import get_logger
+from logger import get_logger, close_result_handlers
 
 def test_logger_result_writes_file(tmp_path):
     logfile = tmp_path / 'out.log'
@@ -9,3 +10,81 @@ def test_logger_result_writes_file(tmp_path):
     with open(logfile, 'r', encoding='utf-8') as f:
         data = f.read()
     assert 'hello world' in data
+
+
+def test_result_handlers_are_pooled_and_buffered(tmp_path):
+    from logger import result_handler, set_result_buffering, flush_result_handlers, close_result_handlers
+    logfile = tmp_path / 'pooled.log'
+    first = get_logger('pooled_a')
+    second = get_logger('pooled_b')
+    set_result_buffering(buffer_size=1 << 20)
+    try:
+        first.result('line 1', logfile=str(logfile), output_stdout=False)
+        second.result(['line', 2], logfile=str(logfile), output_stdout=False)
+        assert result_handler(str(logfile)) is result_handler(str(tmp_path / '.' / 'pooled.log'))
+        assert not logfile.exists() or logfile.read_text() == ''
+        flush_result_handlers()
+        assert logfile.read_text(encoding='utf-8') == 'line 1\nline 2\n'
+        first.result('line 3', logfile=str(logfile), output_stdout=False)
+    finally:
+        set_result_buffering()
+        close_result_handlers()
+    assert logfile.read_text(encoding='utf-8').endswith('line 3\n')
+
+
+def test_result_logfile_does_not_echo_to_stdout(tmp_path, capsys):
+    logger = get_logger('no_echo')
+    logger.result('only in file', logfile=str(tmp_path / 'f.log'), output_stdout=False)
+    assert 'only in file' not in capsys.readouterr().out
+
+
+def test_result_many_formats(tmp_path):
+    logger = get_logger('result_many')
+    logfile = tmp_path / 'many.log'
+    rows = [{'name': 'a', 'n': 1}, {'name': 'bbb', 'n': 22}]
+    assert logger.result_many(rows, logfile=str(logfile), output_stdout=False, format='csv') == 2
+    assert logger.result_many(rows, logfile=str(logfile), output_stdout=False, format='jsonl') == 2
+    assert logger.result_many(rows, logfile=str(logfile), output_stdout=False, format='table') == 2
+    assert logger.result_many([['x', 1]], logfile=str(logfile), output_stdout=False, prefix='P') == 1
+    close_result_handlers()
+    assert logfile.read_text(encoding='utf-8') == (
+        'name,n\na,1\nbbb,22\n'
+        '{"name": "a", "n": 1}\n{"name": "bbb", "n": 22}\n'
+        'name   n\na      1\nbbb   22\n'
+        'P x 1\n'
+    )
+
+
+def test_result_writer_streams_chunks_to_stdout():
+    import io
+    logger = get_logger('result_writer')
+    handler = logger.result_stream_handler
+    stream = io.StringIO()
+    handler.setStream(stream)
+    try:
+        with logger.result_writer(chunk_size=16) as writer:
+            writer.write(['row', 1])
+            assert stream.getvalue() == ''
+            writer.write_many([['row', i] for i in range(2, 5)])
+            assert stream.getvalue().startswith('row 1\nrow 2\nrow 3\n')
+        assert stream.getvalue() == 'row 1\nrow 2\nrow 3\nrow 4\n'
+    finally:
+        handler.setStream(sys.stdout)
+
+
+class ClosedPipe:
+    def write(self, text):
+        raise BrokenPipeError
+    def flush(self):
+        pass
+
+
+def test_result_many_stops_on_broken_pipe():
+    logger = get_logger('result_broken_pipe')
+    handler = logger.result_stream_handler
+    handler.setStream(ClosedPipe())
+    try:
+        count = logger.result_many((['row', i] for i in range(100000)), chunk_size=64)
+    finally:
+        handler.setStream(sys.stdout)
+    assert count < 100000
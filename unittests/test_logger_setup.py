@@ -41,3 +41,75 @@ def test_setup_logging_writes_file(tmp_path):
     assert logfile.exists()
     data = logfile.read_text(encoding='utf-8')
     assert 'hello' in data
+
+
+def write_config(tmp_path, handler_class='logging.FileHandler', queue=None):
+    import yaml
+    cfg = {
+        'version': 1,
+        'disable_existing_loggers': False,
+        'formatters': {'simple': {'format': '%(message)s'}},
+        'handlers': {
+            'fileHandler': {
+                'class': handler_class,
+                'level': 'INFO',
+                'formatter': 'simple',
+                'filename': '__LOGFILE__'
+            }
+        },
+        'loggers': {
+            'queued': {'level': 'DEBUG', 'handlers': ['fileHandler'], 'propagate': False}
+        },
+        'root': {'level': 'INFO'}
+    }
+    if queue is not None:
+        cfg['queue'] = queue
+    cfg_path = tmp_path / 'cfg.yaml'
+    with open(cfg_path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump(cfg, f)
+    return cfg_path
+
+
+def test_setup_logging_queue_mode(tmp_path):
+    from logger import stop_queue_logging, RoutingQueueHandler
+    cfg_path = write_config(tmp_path, queue={'enabled': True, 'size': 100})
+    logfile = tmp_path / 'queued.log'
+    setup_logging(config_file=str(cfg_path), logfile=str(logfile))
+    logger = get_logger('queued')
+    assert [type(h) for h in logger.handlers] == [RoutingQueueHandler]
+    logger.debug('below handler level')
+    for i in range(50):
+        logger.info(f'line {i}')
+    stop_queue_logging()
+    lines = logfile.read_text(encoding='utf-8').splitlines()
+    assert lines == [f'line {i}' for i in range(50)]
+    assert [type(h) for h in logger.handlers] == [logging.FileHandler]
+    for h in logger.handlers:
+        h.close()
+
+
+def test_result_many_keeps_order_with_queue_logging(tmp_path):
+    from logger import stop_queue_logging
+    cfg_path = write_config(tmp_path, queue={'enabled': True, 'size': 100})
+    logfile = tmp_path / 'queued.log'
+    setup_logging(config_file=str(cfg_path), logfile=str(logfile))
+    logger = get_logger('queued')
+    for i in range(3):
+        logger.result(f'header {i}')
+    assert logger.result_many([['row', i] for i in range(5)]) == 5
+    stop_queue_logging()
+    lines = logfile.read_text(encoding='utf-8').splitlines()
+    assert lines == [f'header {i}' for i in range(3)] + [f'row {i}' for i in range(5)]
+    for h in logger.handlers:
+        h.close()
+
+
+def test_queue_handler_drop_policy():
+    import queue
+    from logger import RoutingQueueHandler
+    q = queue.Queue(2)
+    handler = RoutingQueueHandler(q, [], overflow='drop_oldest')
+    for i in range(4):
+        handler.enqueue(logging.makeLogRecord({'msg': str(i)}))
+    assert [record.msg for _, record in (q.get_nowait(), q.get_nowait())] == ['2', '3']
+    assert handler.dropped == 2
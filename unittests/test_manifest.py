@@ -0,0 +1,99 @@
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from manifest import load_manifest, write_manifest, collect_entries, detect_subcommand
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'benchmarks'))
+from synthetic import make_package
+
+
+def make_parents():
+    p = argparse.ArgumentParser(add_help=False)
+    p.add_argument('--config')
+    p.add_argument('--verbose', action='store_true')
+    return [p]
+
+
+def test_detect_subcommand_skips_option_values():
+    names = {'run', 'list'}
+    parents = make_parents()
+    assert detect_subcommand(['--config', 'run', 'list', 'x'], names, parents) == 'list'
+    assert detect_subcommand(['--verbose', 'run', 'x'], names, parents) == 'run'
+    assert detect_subcommand(['--config=run', '--', 'run'], names, parents) == 'run'
+    assert detect_subcommand(['--help'], names, parents) is None
+    assert detect_subcommand(['unknown', 'run'], names, parents) is None
+    # unique prefixes of long options, as accepted by argparse
+    assert detect_subcommand(['--conf', 'run', 'list'], names, parents) == 'list'
+    assert detect_subcommand(['--verb', 'run'], names, parents) == 'run'
+    assert detect_subcommand(['--conf=run', 'list'], names, parents) == 'list'
+
+
+@pytest.fixture
+def lazy_package(tmp_path):
+    pkg = make_package(tmp_path, 3)
+    ## first run writes the manifest, later runs import the selected module only
+    subprocess.run([sys.executable, str(pkg), '--help'], capture_output=True)
+    assert (pkg / 'subcommand_manifest.json').exists()
+    return pkg
+
+
+@pytest.mark.parametrize('args', [
+    ['--logl', 'INFO', 'cmd1', '-h'],
+    ['--loglevel=INFO', 'cmd1', '-h'],
+    ['--conf', os.devnull, 'cmd1', '-h'],
+])
+def test_lazy_parser_detects_subcommand_after_root_options(lazy_package, args):
+    proc = subprocess.run([sys.executable, str(lazy_package), *args], capture_output=True, text=True)
+    assert proc.returncode == 0, proc.stderr
+    assert 'cmd1 options' in proc.stdout
+
+
+def test_lazy_placeholder_loads_its_module(lazy_package):
+    ## subcommand not detected in argv: the selected placeholder imports its module
+    code = (
+        'import sys; sys.path.insert(0, sys.argv[1]); import manifest; '
+        'manifest.detect_subcommand = lambda *args: None; '
+        'import runpy; sys.argv = sys.argv[1:]; runpy.run_path(sys.argv[0], run_name="__main__")'
+    )
+    for args, expected in ((['cmd1', '-h'], 'cmd1 options'), (['cmd1', 'x', '--opt1', '3'], '')):
+        proc = subprocess.run([sys.executable, '-c', code, str(lazy_package), *args], capture_output=True, text=True)
+        assert proc.returncode == 0, proc.stderr
+        assert expected in proc.stdout
+    proc = subprocess.run([sys.executable, '-c', code, str(lazy_package), 'cmd1', 'x', '--bogus'], capture_output=True, text=True)
+    assert proc.returncode == 2 and 'unrecognized arguments: --bogus' in proc.stderr
+
+
+def test_collect_entries_records_new_subcommands_with_aliases():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers()
+    subparsers.add_parser('first', help='first help')
+    known = set(subparsers.choices)
+    subparsers.add_parser('second', aliases=['sec'], help='second help')
+    entries = collect_entries(subparsers, 'mod', known)
+    assert entries == [{'name': 'second', 'aliases': ['sec'], 'help': 'second help', 'module': 'mod'}]
+
+
+def test_manifest_roundtrip_and_staleness(tmp_path):
+    module = tmp_path / 'mod.py'
+    module.write_text('x = 1\n')
+    manifest_file = tmp_path / 'manifest.json'
+    entries = [{'name': 'run', 'aliases': [], 'help': 'run it', 'module': 'mod'}]
+    assert write_manifest(manifest_file, tmp_path, ['mod'], entries)
+    assert load_manifest(manifest_file, tmp_path, ['mod']) == entries
+
+    # module list change invalidates manifest
+    assert load_manifest(manifest_file, tmp_path, ['mod', 'other']) is None
+
+    # module modification invalidates manifest
+    st = os.stat(module)
+    os.utime(module, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    assert load_manifest(manifest_file, tmp_path, ['mod']) is None
+
+
+def test_load_manifest_missing_file(tmp_path):
+    assert load_manifest(tmp_path / 'nope.json', tmp_path, []) is None
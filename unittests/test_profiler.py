@@ -0,0 +1,33 @@
+import json
+
+import profiler
+
+
+def test_phase_is_noop_when_disabled():
+    assert profiler.enable_from_argv(['run', 'x']) is None
+    assert profiler.phase('a') is profiler.phase('b')
+    with profiler.phase('a'):
+        pass
+
+
+def test_enable_from_argv_options():
+    assert profiler.option_value(['--profile-output', 'out.json'], '--profile-output') == 'out.json'
+    assert profiler.option_value(['--profile-output=out.json'], '--profile-output') == 'out.json'
+    assert profiler.enable_from_argv(['run', '--', '--profile-startup']) is None
+
+
+def test_report_written_with_nested_phases(tmp_path):
+    out = tmp_path / 'report.json'
+    pstats_file = tmp_path / 'report.pstats'
+    p = profiler.enable_from_argv(['--profile-startup', '--profile-output', str(out), '--profile-pstats', str(pstats_file)])
+    assert p is not None
+    with profiler.phase('load_subcommands'):
+        with profiler.phase('import:mod'):
+            pass
+    profiler.finish()
+    report = json.loads(out.read_text())
+    assert [(x['name'], x['depth']) for x in report['phases']] == [('load_subcommands', 0), ('import:mod', 1)]
+    assert all(x['duration'] >= 0 for x in report['phases'])
+    assert pstats_file.is_file()
+    # disabled again after finish
+    assert profiler.phase('a') is profiler.phase('b')
@@ -0,0 +1,77 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from client import strip_option
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'benchmarks'))
+from synthetic import make_package
+
+pytestmark = pytest.mark.skipif(not hasattr(os, 'fork'), reason='server mode needs fork')
+
+
+def test_strip_option():
+    assert strip_option(['--serve', 's', 'run', '--serve=x', 'a'], '--serve') == ['run', 'a']
+
+
+@pytest.fixture
+def server(tmp_path):
+    pkg = make_package(tmp_path, 3)
+    sock = tmp_path / 's.sock'
+    env = {**os.environ, 'SUBCOMMAND_CACHE_DIR': str(tmp_path / 'cache')}
+    env.pop('SUBCOMMAND_SERVER', None)
+    proc = subprocess.Popen([sys.executable, str(pkg), '--serve', str(sock)], cwd=tmp_path, env=env)
+    for _ in range(200):
+        if sock.exists():
+            break
+        time.sleep(0.05)
+    yield pkg, sock, {**env, 'SUBCOMMAND_SERVER': str(sock)}
+    proc.terminate()
+    proc.wait(10)
+    assert not sock.exists()
+
+
+def run(pkg, env, *args, cwd=None):
+    return subprocess.run([sys.executable, str(pkg), *args], env=env, cwd=cwd, capture_output=True, text=True)
+
+
+def test_server_runs_requests_like_local_invocation(server, tmp_path):
+    pkg, sock, env = server
+    local = {k: v for k, v in env.items() if k != 'SUBCOMMAND_SERVER'}
+    for args in (['--help'], ['cmd1', 'x'], ['cmd1'], []):
+        remote, expected = run(pkg, env, *args, cwd=tmp_path), run(pkg, local, *args, cwd=tmp_path)
+        assert (remote.returncode, remote.stdout, remote.stderr) == (expected.returncode, expected.stdout, expected.stderr)
+    ## phases of the request only, the parser was built by the server
+    report = json.loads(run(pkg, env, 'cmd1', 'x', '--profile-startup').stderr)
+    phases = [p['name'] for p in report['phases']]
+    assert 'handler' in phases and 'build_parser' not in phases
+
+
+def test_serve_option_only_before_subcommand(tmp_path):
+    pkg = make_package(tmp_path, 1)
+    env = {k: v for k, v in os.environ.items() if k != 'SUBCOMMAND_SERVER'}
+    assert '--serve SOCKET' in run(pkg, env, '--help').stdout
+    assert run(pkg, env, 'cmd0', '--', '--serve', str(tmp_path / 's.sock')).returncode == 0
+    proc = run(pkg, env, 'cmd0', 'x', '--serve', str(tmp_path / 's.sock'))
+    assert proc.returncode == 2 and 'unrecognized arguments: --serve' in proc.stderr
+    assert not (tmp_path / 's.sock').exists()
+
+
+def test_server_declines_stale_package(server, tmp_path):
+    pkg, sock, env = server
+    assert run(pkg, env, 'cmd0', 'x').returncode == 0
+    config_file = pkg / 'package_config.yaml'
+    config_file.write_text(config_file.read_text() + '  description2: changed\n')
+    ## falls back to a local run and stops the server
+    assert run(pkg, env, 'cmd0', 'x').returncode == 0
+    for _ in range(100):
+        if not sock.exists():
+            break
+        time.sleep(0.05)
+    assert not sock.exists()
+    assert run(pkg, env, 'cmd0', 'x').returncode == 0
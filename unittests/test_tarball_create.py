@@ -1,7 +1,7 @@
 import os
 import tarfile
 
-from utils import tarball_create, TARBALL_TIMESTAMP_FILE
+from utils import tarball_create, tarball_restore, TARBALL_TIMESTAMP_FILE
 
 
 def make_sample_dir(path, name="pkg"):
@@ -52,3 +52,191 @@ def test_tarball_create_invalid_tarout_extension_raises(tmp_path):
     except ValueError:
         raised = True
     assert raised
+
+
+def test_tarball_create_parallel_codecs(tmp_path, monkeypatch):
+    import utils
+    monkeypatch.setattr(utils, 'TARBALL_BLOCK_SIZE', 1024)
+    target = make_sample_dir(tmp_path, 'par')
+    with open(os.path.join(target, 'b.bin'), 'wb') as f:
+        f.write(os.urandom(8192))
+    for codec, extension in [('gz', '.tar.gz'), ('bz2', '.tar.bz2'), ('xz', '.tar.xz')]:
+        out = tarball_create(target, dstdir=str(tmp_path), suffix='p', codec=codec, level=1, jobs=3)
+        assert out.endswith(extension)
+        with tarfile.open(out, 'r:*') as t:
+            assert t.extractfile('par/b.bin').read() == open(os.path.join(target, 'b.bin'), 'rb').read()
+            assert f'par/{TARBALL_TIMESTAMP_FILE}' in t.getnames()
+        assert tarball_restore(out, jobs=2) == target
+
+
+def test_block_compressor_writes_concatenated_gzip_members(tmp_path):
+    import gzip
+    from utils import BlockCompressor
+    data = os.urandom(5000) * 3
+    with open(tmp_path / 'out.gz', 'wb') as f:
+        compressor = BlockCompressor(f, 'gz', level=1, jobs=2, block_size=1000)
+        compressor.write(data)
+        compressor.close()
+    assert gzip.decompress((tmp_path / 'out.gz').read_bytes()) == data
+
+
+def test_tarball_restore_roundtrip_reads_timestamp_at_head(tmp_path):
+    target = make_sample_dir(tmp_path, 'rt')
+    os.makedirs(os.path.join(target, 'sub'))
+    with open(os.path.join(target, 'sub', 'big.bin'), 'wb') as f:
+        f.write(b'x' * (2 << 20))
+    os.symlink('a.txt', os.path.join(target, 'link'))
+    out = tarball_create(target, dstdir=str(tmp_path), delete_target=True)
+    with tarfile.open(out, 'r:gz') as t:
+        assert t.getnames()[:2] == ['rt', f'rt/{TARBALL_TIMESTAMP_FILE}']
+    assert tarball_restore(out, jobs=2) == target
+    assert open(os.path.join(target, 'a.txt')).read() == 'hello'
+    assert os.path.getsize(os.path.join(target, 'sub', 'big.bin')) == 2 << 20
+    assert os.readlink(os.path.join(target, 'link')) == 'a.txt'
+    assert not os.path.exists(os.path.join(target, TARBALL_TIMESTAMP_FILE))
+
+
+def add_bytes(tar, name, data):
+    import io
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    tar.addfile(info, io.BytesIO(data))
+
+
+def test_tarball_restore_legacy_layout_and_traversal(tmp_path):
+    source = make_sample_dir(tmp_path, 'src')
+    legacy = tmp_path / 'legacy.tar.gz'
+    with tarfile.open(legacy, 'w:gz') as t:
+        t.add(source, 'src', recursive=False)
+        add_bytes(t, 'src/a.txt', b'hello')
+        add_bytes(t, f'src/{TARBALL_TIMESTAMP_FILE}', f'#TARBALL\n#SRC src\n#DST {tmp_path}/dst\n'.encode())
+    assert tarball_restore(str(legacy)) == str(tmp_path / 'dst' / 'src')
+    assert os.listdir(tmp_path / 'dst' / 'src') == ['a.txt']
+
+    evil = tmp_path / 'evil.tar.gz'
+    with tarfile.open(evil, 'w:gz') as t:
+        t.add(source, 'src', recursive=False)
+        add_bytes(t, f'src/{TARBALL_TIMESTAMP_FILE}', f'#TARBALL\n#SRC src\n#DST {tmp_path}/evil\n'.encode())
+        add_bytes(t, 'src/../../outside', b'x')
+    try:
+        tarball_restore(str(evil))
+        raised = False
+    except tarfile.ExtractError:
+        raised = True
+    assert raised
+    assert not (tmp_path / 'outside').exists()
+
+
+def test_tarball_create_leaves_source_and_cwd_untouched(tmp_path):
+    target = make_sample_dir(tmp_path, 'ro')
+    os.chmod(target, 0o555)
+    cwd = os.getcwd()
+    try:
+        out = tarball_create(target, dstdir=str(tmp_path))
+    finally:
+        os.chmod(target, 0o755)
+    assert os.getcwd() == cwd
+    assert os.listdir(target) == ['a.txt']
+    with tarfile.open(out, 'r:gz') as t:
+        assert t.getnames() == ['ro', f'ro/{TARBALL_TIMESTAMP_FILE}', 'ro/a.txt']
+
+
+def test_tarball_create_many(tmp_path):
+    from utils import tarball_create_many
+    targets = [make_sample_dir(tmp_path, f'run{i}') for i in range(6)]
+    outdir = tmp_path / 'out'
+    outdir.mkdir()
+    outs = tarball_create_many(targets, workers=3, dstdir=str(outdir), suffix='n')
+    assert outs == [str(outdir / f'run{i}-n.tar.gz') for i in range(6)]
+    results = tarball_create_many([targets[0], str(tmp_path / 'missing')], return_exceptions=True, dstdir=str(outdir))
+    assert os.path.isfile(results[0])
+    assert isinstance(results[1], FileNotFoundError)
+
+
+def test_tarball_incremental_chain(tmp_path):
+    import shutil
+    from utils import tarball_manifest
+    target = make_sample_dir(tmp_path, 'inc')
+    os.makedirs(os.path.join(target, 'sub'))
+    with open(os.path.join(target, 'sub', 'keep.txt'), 'w') as f:
+        f.write('keep')
+    outdir = tmp_path / 'out'
+    outdir.mkdir()
+    full = tarball_create(target, dstdir=str(outdir), suffix='0', checksum=True)
+    assert 'inc/a.txt' in manifest_entries(full)
+
+    ## change a.txt, add new.txt, delete sub/
+    with open(os.path.join(target, 'a.txt'), 'w') as f:
+        f.write('changed')
+    with open(os.path.join(target, 'new.txt'), 'w') as f:
+        f.write('new')
+    shutil.rmtree(os.path.join(target, 'sub'))
+    inc1 = tarball_create(target, dstdir=str(outdir), suffix='1', base=full)
+    assert set(manifest_entries(inc1)) == {'inc', 'inc/a.txt', 'inc/new.txt'}
+    assert tarball_manifest(inc1)['deleted'] == ['sub', 'sub/keep.txt']
+
+    ## nothing changed: only directories
+    inc2 = tarball_create(target, dstdir=str(outdir), suffix='2', base=inc1)
+    assert manifest_entries(inc2) == ['inc']
+
+    shutil.rmtree(target)
+    assert tarball_restore(inc1) is False
+    assert tarball_restore(full, increments=[inc2]) is False
+    assert tarball_restore(full, increments=[inc1, inc2]) == target
+    assert sorted(os.listdir(target)) == ['a.txt', 'new.txt']
+    assert open(os.path.join(target, 'a.txt')).read() == 'changed'
+
+
+def manifest_entries(tarball):
+    from utils import TARBALL_MANIFEST_FILE
+    with tarfile.open(tarball, 'r:*') as t:
+        return [n for n in t.getnames() if not n.endswith((TARBALL_TIMESTAMP_FILE, TARBALL_MANIFEST_FILE))]
+
+
+def test_tarball_index_extract_member(tmp_path, monkeypatch):
+    import utils
+    from utils import tarball_list, tarball_extract_member, TARBALL_INDEX_SUFFIX
+    monkeypatch.setattr(utils, 'TARBALL_BLOCK_SIZE', 4096)
+    target = make_sample_dir(tmp_path, 'idx')
+    contents = {f'idx/f{i}.bin': os.urandom(3000 + i) for i in range(10)}
+    for name, data in contents.items():
+        with open(os.path.join(str(tmp_path), name), 'wb') as f:
+            f.write(data)
+    out = tarball_create(target, dstdir=str(tmp_path), index=True, jobs=2)
+    assert os.path.isfile(out + TARBALL_INDEX_SUFFIX)
+    names = tarball_list(out)
+    assert names[:2] == ['idx', f'idx/{TARBALL_TIMESTAMP_FILE}']
+    assert set(contents) < set(names)
+    for name, data in contents.items():
+        assert tarball_extract_member(out, name) == data
+
+    ## stale or missing index falls back to reading the stream
+    with open(out + TARBALL_INDEX_SUFFIX, 'w') as f:
+        f.write('{}')
+    assert tarball_extract_member(out, 'idx/f7.bin') == contents['idx/f7.bin']
+    try:
+        tarball_extract_member(out, 'idx/missing')
+        raised = False
+    except KeyError:
+        raised = True
+    assert raised
+
+
+def test_tarball_index_detects_rewritten_tarball(tmp_path):
+    from utils import tarball_index, TARBALL_INDEX_SUFFIX
+    target = make_sample_dir(tmp_path, 'idx')
+    out = tarball_create(target, dstdir=str(tmp_path), suffix='fixed', index=True)
+    assert tarball_index(out) is not None
+
+    ## same size and mtime, other content
+    st = os.stat(out)
+    with open(out, 'r+b') as f:
+        head = f.read(1)
+        f.seek(0)
+        f.write(bytes([head[0] ^ 0xff]))
+    os.utime(out, ns=(st.st_atime_ns, st.st_mtime_ns))
+    assert tarball_index(out) is None
+
+    ## rewriting without index removes the sidecar index
+    assert tarball_create(target, dstdir=str(tmp_path), suffix='fixed', index=False) == out
+    assert not os.path.exists(out + TARBALL_INDEX_SUFFIX)
@@ -22,3 +22,81 @@ def test_recursive_chmod(tmp_path):
     st = os.stat(f)
     assert bool(st.st_mode & stat.S_IXUSR)
     assert bool(st.st_mode & stat.S_IRUSR)
+
+def test_compiled_mode_symbolic_and_octal():
+    from utils import Mode
+    assert Mode('755').apply(0o100600) == 0o755
+    assert Mode(0o640).apply(0o100777) == 0o640
+    assert Mode('u=rw,go=r').apply(0o100777) == 0o644
+    assert Mode('a+X').apply(0o100644) == 0o644
+    assert Mode('a+X').apply(0o100744) == 0o755
+    assert Mode('a+X').apply(0o040700) == 0o711
+    assert Mode('go-w+r').apply(0o100622) == 0o644
+    assert Mode('g=u').apply(0o100750) == 0o770
+    assert Mode('+t,u+s').apply(0o040755) == 0o5755
+    assert Mode('o=').apply(0o101777) == 0o770
+    for bad in ['', 'u', 'u*x', 'z+x', 'u+q']:
+        try:
+            Mode(bad)
+            raised = False
+        except ValueError:
+            raised = True
+        assert raised, bad
+
+def test_recursive_chmod_parallel_skips_symlinks(tmp_path):
+    d = tmp_path / 'd'
+    for sub in ['a', 'b', 'c/deep']:
+        (d / sub).mkdir(parents=True)
+        (d / sub / 'file').write_text('x')
+        os.chmod(d / sub / 'file', 0o600)
+    outside = tmp_path / 'outside'
+    outside.write_text('x')
+    os.chmod(outside, 0o600)
+    (d / 'link').symlink_to(outside)
+    recursive_chmod(str(d), 'go+rX', jobs=3)
+    assert stat.S_IMODE(os.stat(d / 'c' / 'deep' / 'file').st_mode) == 0o644
+    assert stat.S_IMODE(os.stat(d / 'c' / 'deep').st_mode) & 0o055 == 0o055
+    assert stat.S_IMODE(os.stat(outside).st_mode) == 0o600
+
+def test_force_rmtree_restrictive_tree(tmp_path):
+    from utils import force_rmtree
+    d = tmp_path / 'd'
+    for sub in ['a/x', 'b', 'c']:
+        (d / sub).mkdir(parents=True)
+        (d / sub / 'file').write_text('x')
+    (d / 'top').write_text('x')
+    os.chmod(d / 'a' / 'x', 0o000)
+    os.chmod(d / 'a', 0o500)
+    os.chmod(d / 'b', 0o000)
+    force_rmtree(str(d), jobs=2)
+    assert not d.exists()
+
+def test_mode_keeps_directory_setid_bits_like_gnu_chmod(tmp_path):
+    import shutil
+    import subprocess
+    from utils import Mode
+    cases = [
+        ('755', 0o42755, 0o2755), ('0755', 0o46755, 0o6755), ('00755', 0o42755, 0o755),
+        ('2750', 0o44755, 0o6750), ('u=rwx,go=rx', 0o46700, 0o6755), ('a=rx', 0o42777, 0o2555),
+        ('u=rwxs', 0o40755, 0o4755), ('g=u', 0o42700, 0o2770), ('go-s', 0o46755, 0o4755),
+    ]
+    for mode, current, expected in cases:
+        assert Mode(mode).apply(current) == expected, mode
+    ## regular files: '=' and octal modes are absolute
+    assert Mode('755').apply(0o106755) == 0o755
+    assert Mode('u=rwx').apply(0o104755) == 0o755
+
+    gnu = shutil.which('chmod')
+    if gnu is None or 'GNU' not in subprocess.run([gnu, '--version'], capture_output=True, text=True).stdout:
+        return
+    d = tmp_path / 'd'
+    d.mkdir()
+    for mode, current, _ in cases:
+        os.chmod(d, stat.S_IMODE(current))
+        if stat.S_IMODE(os.stat(d).st_mode) != stat.S_IMODE(current): # setgid dropped (not group member)
+            continue
+        subprocess.run([gnu, mode, str(d)], check=True)
+        expected = stat.S_IMODE(os.stat(d).st_mode)
+        os.chmod(d, stat.S_IMODE(current))
+        chmod(str(d), mode)
+        assert stat.S_IMODE(os.stat(d).st_mode) == expected, mode